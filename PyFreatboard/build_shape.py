@@ -1,6 +1,13 @@
 from PyFreatboard.shape import Shape
-from PyFreatboard.finger import Finger
-from PyFreatboard.draw_freatboard import DrawFreatboard
+from PyFreatboard.finger import Finger, FingerIndex
+from PyFreatboard.shape_filter import ShapeFilter
+from PyFreatboard.shape_search import ShapeSearch, SearchStats
+from PyFreatboard.instrumentation import instrumented
+
+
+def _shape_key(build_shape, *args, **kwargs):
+    """Key of the instrumentation records of BuildShape methods, root and type as in Song"""
+    return build_shape.root + build_shape.shape_type
 
 
 class BuildShape:
@@ -39,53 +46,112 @@ class BuildShape:
         self.root = root
         self.shape_type = shape_type
         self.plot_type = plot_type
-        self.all_shapes = self.scale_to_freatboard()
+        self._all_shapes = None
+        # Counters of the last search (all shapes, scale_to_freatboard or build_drop)
+        self.search_stats = SearchStats()
 
-        # Set fingering for each shape
-        shapes_with_fingers = []
-        for i in range(len(self.all_shapes)):
-            shapes_with_fingers.append(self.all_shapes[i].set_fingering())
-        self.all_shapes = shapes_with_fingers
+    @property
+    def all_shapes(self):
+        """Fingered shapes sorted by position, including the invalid or redundant ones. Built on first access."""
+        if self._all_shapes is None:
+            self._all_shapes = self.__build_all_shapes__()
+        return self._all_shapes
 
-        # Filter invalid or redundant shapes
-        self.all_shapes = self.filter_shapes(self.all_shapes)
-                
+    @all_shapes.setter
+    def all_shapes(self, shapes):
+        self._all_shapes = shapes
+
+    @instrumented('all_shapes', key=_shape_key, count=len)
+    def __build_all_shapes__(self):
+        return list(self.__iter_all_shapes__())
+
+    def iter_shapes(self, position=None, limit=None):
+        """Yield valid shapes, sorted by position, while they are generated.
+
+        If position is given only shapes played from that position (lowest freat equal to
+        position or, with a 1st finger extension, position - 1) are yielded. The search stops
+        once limit shapes have been yielded or no more shapes at position can be found.
+        """
+        if limit is not None and limit <= 0:
+            return
+        count = 0
+        for shape in self.__iter_all_shapes__(position):
+            if not shape.valid:
+                continue
+            if position is not None:
+                min_freat = shape.get_max_min_freat()[1]
+                if min_freat > position:
+                    return
+                if min_freat < position - 1:
+                    continue
+            yield shape
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def __iter_all_shapes__(self, position=None):
+        """Same shapes than fill_shape, fingering and filter_shapes, yielded while they are found.
+
+        Starting fingers are searched from the lowest freat. A shape starts at most 4 freats
+        above its lowest freat and shapes competing in filter_shapes start at most 4 freats
+        apart, so a shape is final once every start up to 8 freats above its lowest freat
+        has been searched.
+        """
+        self.search_stats = SearchStats()
+        scale, harmony = self.get_shape_notes_and_harmony()
+        fingers = FingerIndex(self.__semitone_to_finger__(scale, harmony, Finger.guitar_strings))
+        starts = fingers.on_string('E')
+        order = sorted(range(len(starts)), key=lambda i: starts[i].freat)
+        shape_filter = ShapeFilter()
+
+        for n, i in enumerate(order):
+            r = starts[i]
+            shapes = []
+            self.fill_shape(Shape([r]), harmony, (harmony.index(r.function) + 1) % len(harmony), fingers, shapes, r.freat, r.freat)
+            for e, shape in enumerate(shapes):
+                shape = shape.set_fingering()
+                # (lowest freat, generation order) as in the stable sort of filter_shapes
+                shape_filter.add(shape, (shape.get_max_min_freat()[1], i, e))
+
+            if n + 1 < len(order):
+                next_freat = starts[order[n + 1]].freat
+                yield from shape_filter.process(next_freat - 9)
+                if position is not None and next_freat - 9 >= position:
+                    return
+        yield from shape_filter.process()
+
+    @instrumented('scale_to_freatboard', key=_shape_key, count=len)
     def scale_to_freatboard(self):
+        self.search_stats = SearchStats()
         all_shapes = []
         scale, harmony = self.get_shape_notes_and_harmony()
-        fingers = self.__semitone_to_finger__(scale, harmony, Finger.guitar_strings)
+        fingers = FingerIndex(self.__semitone_to_finger__(scale, harmony, Finger.guitar_strings))
             
-        for r in fingers:
-            if r.string == 'E':
-                shape = Shape([r])
-                self.fill_shape(shape, harmony, (harmony.index(r.function) + 1) % len(harmony), fingers, all_shapes, r.freat, r.freat)
+        for r in fingers.on_string('E'):
+            shape = Shape([r])
+            self.fill_shape(shape, harmony, (harmony.index(r.function) + 1) % len(harmony), fingers, all_shapes, r.freat, r.freat)
             
         return all_shapes
 
     def get_shape_notes_and_harmony(self):
+        return BuildShape.notes_and_harmony(self.root, self.shape_type)
+
+    @staticmethod
+    def notes_and_harmony(root, shape_type):
         shapes_file = BuildShape.SHAPES
-        harmony = shapes_file[self.shape_type]
+        harmony = shapes_file[shape_type]
         shape_notes = []
         for note in harmony:
-            shape_notes.append((Finger.NOTES[self.root] + Finger.INTERVALS[note]) % 12)
+            shape_notes.append((Finger.NOTES[root] + Finger.INTERVALS[note]) % 12)
         return shape_notes, harmony
 
 
+    @instrumented('fill_shape', key=_shape_key)
     def fill_shape(self, shape, harmony, pointer, fingers, all_shapes, min_freat, max_freat, depth=0):
-        valid_fingers = []
-        for f in fingers:
-            if f.function == harmony[pointer] and f.dist(shape.fingers[-1]) > 0 and f.dist(shape.fingers[-1]) < 12 and abs(f.freat - shape.fingers[-1].freat) < 5:
-                valid_fingers.append(f)
-        if len(valid_fingers) > 0:
-            for f in valid_fingers:
-                new_min = min(min_freat, f.freat)
-                new_max = max(max_freat, f.freat)
-                if new_max - new_min < 5 and new_min > 0:
-                    self.fill_shape(shape + [f], harmony, (pointer + 1)%len(harmony), fingers, all_shapes, new_min, new_max, depth+1)
-                elif shape.fingers[-1].string == 'e':
-                    all_shapes.append(shape)
-        else:
-            all_shapes.append(shape)
+        """Append to all_shapes the shapes extending shape. depth is not used, kept for compatibility."""
+        if not isinstance(fingers, FingerIndex):
+            fingers = FingerIndex(fingers)
+        ShapeSearch(fingers, harmony, self.search_stats).search(shape.fingers, pointer, min_freat, max_freat, all_shapes)
             
     def __semitone_to_finger__(self, semitone, function, guitar_strings):
         fingers = []
@@ -101,45 +167,22 @@ class BuildShape:
                     fingers.append(Finger(n, h, string, freat + 12, None))    
         return fingers
 
-    def filter_shapes(self, shapes):
-        shapes.sort()
+    @staticmethod
+    @instrumented('filter_shapes', count=len)
+    def filter_shapes(shapes):
+        shape_filter = ShapeFilter()
         for i, s in enumerate(shapes):
-            extensions = s.get_extensions()
-            if extensions >= 4:
-                s.valid = False
-            if s.valid:
-                # Remove same position with less notes in 6th string
-                last_finger = s.fingers[-1]
-                for j, s2 in enumerate(shapes[i+1:]):
-                    if s2.valid and s2.fingers[-1] == last_finger and len(s2.fingers) != len(s.fingers):
-                        same_shape = True
-                        k = 1
-                        while same_shape and k < min(len(s.fingers), len(s2.fingers)):
-                            index = -1 - k
-                            if s.fingers[index] == s2.fingers[index]:
-                                k += 1
-                            else:
-                                same_shape = False
-                        if same_shape:
-                            if len(s2.fingers) < len(s.fingers):
-                                s2.valid = False
-                            else:
-                                s.valid = False
-
-                # Remove same position with more extensions
-                first_finger = s.fingers[0]
-                for j, s2 in enumerate(shapes[i+1:]):
-                    if s2.valid and s2.fingers[0] == first_finger:
-                        if s2.get_extensions() >= extensions:
-                            s2.valid = False
-                        else:
-                            s.valid = False
-        return shapes
+            shape_filter.add(s, (s.get_max_min_freat()[1], i))
+        return list(shape_filter.process())
 
-    def build_drop(self, drop=2, bass_string='D'):
-        notes, harmony = self.get_shape_notes_and_harmony()
+    def get_drop_notes_and_harmony(self, drop=2):
+        return BuildShape.drop_notes_and_harmony(*self.get_shape_notes_and_harmony(), drop)
+
+    @staticmethod
+    def drop_notes_and_harmony(notes, harmony, drop=2):
+        """Notes and harmony of every inversion once the drop is applied"""
         assert drop > 1 and drop < len(notes)
-        all_drops = []
+        inversions = []
         
         for i in range(len(notes)):
             # get inversion
@@ -159,30 +202,132 @@ class BuildShape:
                 post_drop = [post_drop]
                 post_drop_h = [post_drop_h]
             
-            drop_notes = bass + pre_drop + post_drop
-            drop_h = bass_h + pre_drop_h + post_drop_h
-            fingers = self.__semitone_to_finger__(drop_notes, drop_h, Finger.guitar_strings)
-            all_drops_tmp = []    
-            for r in fingers:
-                if r.string == bass_string:
-                    shape = Shape([r])
-                    self.fill_shape(shape, drop_h, (drop_h.index(r.function) + 1) % len(drop_h), fingers, all_drops_tmp, r.freat, r.freat)
-                
-            all_drops += all_drops_tmp
-
-        # Set fingering for each shape
-        shapes_with_fingers = []
-        for i in range(len(all_drops)):
-            shapes_with_fingers.append(all_drops[i].set_fingering())
-        all_drops = shapes_with_fingers
-
-        # Filter invalid or redundant shapes
-        # all_drops = self.filter_shapes(all_drops)
-        all_drops = self.filter_drops(all_drops, len(notes))
-        all_drops.sort()
+            inversions.append((bass + pre_drop + post_drop, bass_h + pre_drop_h + post_drop_h))
+        return inversions
+
+    @instrumented('build_drop', key=_shape_key, count=len)
+    def build_drop(self, drop=2, bass_string='D'):
+        """Valid drop voicings with the lowest note on bass_string, sorted by position"""
+        assert drop > 1 and drop < len(self.get_shape_notes_and_harmony()[0])
+        return BuildShape.drops_from_matrix(self.build_drops([drop], [bass_string]), drop, bass_string)
+
+    @instrumented('build_drops', key=_shape_key, count=lambda matrix: sum(len(v) for v in matrix.values()))
+    def build_drops(self, drops=(2, 3), bass_strings=('E', 'A', 'D')):
+        """Valid drop voicings for every drop, bass string and inversion in one pass.
+
+        Returns a dict indexed by (drop, bass_string, inversion), where inversion is the position
+        in get_drop_notes_and_harmony(drop), with the voicings of each entry sorted by position.
+        Drops that do not apply to the shape are skipped.
+
+        Voicings lie on adjacent strings from bass_string, so their notes are placed directly
+        from every bass note. The search is only run to extend each voicing towards the 'e'
+        string, which decides its fingering and whether it fits in 4 freats, keeping the
+        results of the full search followed by filter_drops. The finger table and the
+        extended voicings are shared by all the entries.
+        """
+        self.search_stats = SearchStats()
+        notes, harmony = self.get_shape_notes_and_harmony()
+        fingers = FingerIndex(self.__semitone_to_finger__(notes, harmony, Finger.guitar_strings))
+        voicings = {}
+        matrix = {}
+        for drop in drops:
+            if drop < 2 or drop >= len(notes):
+                continue
+            for i, (drop_notes, drop_h) in enumerate(BuildShape.drop_notes_and_harmony(notes, harmony, drop)):
+                for bass_string in bass_strings:
+                    matrix[(drop, bass_string, i)] = self.__build_inversion__(drop_notes, drop_h, bass_string, fingers, voicings)
+        return matrix
+
+    @staticmethod
+    def drops_from_matrix(matrix, drop, bass_string):
+        """All the inversions of a drop and bass string from build_drops, sorted by position"""
+        all_drops = []
+        i = 0
+        while (drop, bass_string, i) in matrix:
+            all_drops += matrix[(drop, bass_string, i)]
+            i += 1
+        all_drops.sort(key=lambda s: s.get_max_min_freat()[1])
         return all_drops
+
+    @instrumented('drop_positions', key=_shape_key, count=len)
+    def drop_positions(self, drop=2, bass_string='D'):
+        """Position of every voicing of build_drop(drop, bass_string) in the list build_drop returned
+        before 0.4, with the invalid voicings too. Used to keep the file names of the diagrams.
+
+        Runs the former full search from every bass note followed by filter_drops, so it is
+        much slower than build_drop. ShapeCache.get_drops memoizes it.
+        """
+        notes, harmony = self.get_shape_notes_and_harmony()
+        assert drop > 1 and drop < len(notes)
+        self.search_stats = SearchStats()
+        all_drops = []
+        for drop_notes, drop_h in BuildShape.drop_notes_and_harmony(notes, harmony, drop):
+            fingers = FingerIndex(self.__semitone_to_finger__(drop_notes, drop_h, Finger.guitar_strings))
+            search = ShapeSearch(fingers, drop_h, self.search_stats)
+            for r in fingers.on_string(bass_string):
+                search.search([r], (drop_h.index(r.function) + 1) % len(drop_h), r.freat, r.freat, all_drops)
+        all_drops = BuildShape.filter_drops([s.set_fingering() for s in all_drops], len(notes))
+        # stable sort by position, like the former all_drops.sort()
+        order = sorted(range(len(all_drops)), key=lambda i: all_drops[i].get_max_min_freat()[1])
+        return [position for position, i in enumerate(order) if all_drops[i].valid]
+
+    def __build_inversion__(self, drop_notes, drop_h, bass_string, fingers, voicings):
+        length = len(drop_h)
+        bass = Finger.STRING_CODES[bass_string]
+        drops = []
+        if bass + 1 < length:
+            # not enough strings
+            return drops
+
+        search = ShapeSearch(fingers, drop_h, self.search_stats, max_span=3)
+        # Bass notes in the same order than __semitone_to_finger__(drop_notes, drop_h)
+        for n, h in zip(drop_notes, drop_h):
+            freat = (n - Finger.NOTES[bass_string.upper()]) % 12
+            for start in ([freat, freat + 12] if freat < 5 else [freat]):
+                r = fingers.find(h, Finger.STRING_SEMITONES[bass_string] + start, bass_string)
+                voicing = self.__place_voicing__(r, drop_h, fingers, bass)
+                if voicing is None:
+                    continue
+                # The extension only depends on the voicing, whatever drop or inversion placed it
+                key = tuple((f.function, f.string, f.freat) for f in voicing)
+                if key not in voicings:
+                    voicings[key] = self.__extend_voicing__(voicing, drop_h, search)
+                drops += [Shape(fingers) for fingers in voicings[key]]
+
+        drops.sort(key=lambda s: s.get_max_min_freat()[1])
+        return drops
+
+    @instrumented('extend_voicing', key=_shape_key, count=len)
+    def __extend_voicing__(self, voicing, harmony, search):
+        """Fingers of the valid voicings found extending voicing"""
+        max_f, min_f = Shape(voicing).get_max_min_freat()
+        if max_f - min_f > 3 or min_f == 0:
+            return []
+        extended = []
+        for shape in search.search(voicing, harmony.index(voicing[0].function), min_f, max_f):
+            shape = shape.set_fingering()
+            max_f, min_f = shape.get_max_min_freat()
+            if max_f - min_f <= 3 and min_f > 0:
+                extended.append(shape.fingers[:len(voicing)])
+        return extended
+
+    def __place_voicing__(self, r, harmony, fingers, bass):
+        """Fingers of the voicing starting at r, one per string from string bass upwards"""
+        voicing = [r]
+        pointer = harmony.index(r.function)
+        for i in range(1, len(harmony)):
+            pointer = (pointer + 1) % len(harmony)
+            last = voicing[-1]
+            interval = (fingers.semitones[harmony[pointer]] - last.semitone) % 12
+            f = fingers.find(harmony[pointer], last.get_pitch() + interval, Finger.guitar_strings[bass - i])
+            if interval == 0 or f is None:
+                return None
+            voicing.append(f)
+        return voicing
         
-    def filter_drops(self, drops, length):
+    @staticmethod
+    @instrumented('filter_drops')
+    def filter_drops(drops, length):
         for d in drops:
             if d.valid:
                 max, min = d.get_max_min_freat()
@@ -206,8 +351,10 @@ class BuildShape:
         return drops
 
 if __name__ == "__main__":
+    from PyFreatboard.draw_freatboard import DrawFreatboard
     drop = BuildShape('D', '-7', 1)
     drops = drop.build_drop(drop=2, bass_string="A")
+    draw = DrawFreatboard()
     for d in drops:
         if d.valid:
-           d.plot(plot_type=DrawFreatboard.TEXT_NOTE)
+           draw.draw_shape(d, text=DrawFreatboard.TEXT_NOTE)
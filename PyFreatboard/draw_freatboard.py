@@ -1,4 +1,11 @@
-from matplotlib import pyplot as plt
+# matplotlib is imported inside the draw methods, so generating shapes does not pay for its startup
+from PyFreatboard.instrumentation import instrumented
+
+
+def _shape_key(draw, shape, text=1, shape_name=None, *args, **kwargs):
+    """Key of the instrumentation records of the draw methods, the shape name"""
+    return shape_name
+
 
 class DrawFreatboard:
     STRINGS = ['e', 'B', 'G', 'D', 'A', 'E']
@@ -16,61 +23,117 @@ class DrawFreatboard:
         self.freat_size = freat_size
         self.string_separation = string_separation
 
+    @instrumented('draw_shape', key=_shape_key)
     def draw_shape(self, shape, text=1, shape_name=None, init_freat=None, show_string_names=True, return_fig=False):
+        from matplotlib import pyplot as plt
         self.text = text
         figure, axes = plt.subplots(dpi=80)
-        max_f, min_f = shape.get_max_min_freat()
-        if init_freat is not None:
-            min_f = init_freat    
-        self.__draw_freatboard__(axes, max_f - min_f, min_f, shape_name, show_string_names)
-        for f in shape.fingers:
-            x = (f.freat - min_f)*self.freat_size + self.freat_size/2
-            y = 5*self.string_separation - DrawFreatboard.STRINGS.index(f.string)*self.string_separation
-            if f.function == '1':
-                circle = plt.Circle((x, y), self.freat_size/5, color='r', fill=True, zorder=2)
-            else:
-                circle = plt.Circle((x, y), self.freat_size/5, color='k', fill=True, zorder=2)
-            axes.add_artist(circle)
-            self.__add_finger_text__(axes, shape, x, y, f)
+        self.__draw_cell__(axes, shape, shape_name, init_freat, show_string_names)
         if return_fig:
             return figure
         else:
             plt.show()
        
+    @instrumented('draw_shape', key=_shape_key)
     def draw_shape_vertical(self, shape, text=1, shape_name=None, init_freat=None, show_string_names=False, return_fig=False):
+        from matplotlib import pyplot as plt
         self.text = text
         figure, axes = plt.subplots(dpi=80)
+        self.__draw_cell__(axes, shape, shape_name, init_freat, show_string_names, is_vertical=True)
+        if return_fig:
+            return figure
+        else:
+            plt.show()
+
+    @instrumented('draw_sheet', key=lambda self, shapes, file_name, *args, **kwargs: file_name, count=lambda pages: pages)
+    def draw_sheet(self, shapes, file_name, columns=4, rows=None, text=1, vertical=False, show_string_names=None, cell_size=4, dpi=80):
+        """Draw a list of (shape_name, shape) on a grid of columns and save it in a single file.
+
+        Pages have rows rows, all the shapes fit in one page by default. More than one page
+        is saved as a multipage PDF, so file_name must end in .pdf. Returns the number of pages.
+        """
+        from matplotlib import pyplot as plt
+        from matplotlib.backends.backend_pdf import PdfPages
+        self.text = text
+        if show_string_names is None:
+            show_string_names = not vertical
+        if rows is None:
+            rows = max(1, -(-len(shapes) // columns))
+        per_page = rows*columns
+        pages = [shapes[i:i + per_page] for i in range(0, len(shapes), per_page)] or [[]]
+        is_pdf = file_name.lower().endswith('.pdf')
+        if len(pages) > 1 and not is_pdf:
+            raise ValueError("{} pages of shapes need a .pdf file, not {}".format(len(pages), file_name))
+        pdf = PdfPages(file_name) if is_pdf else None
+        try:
+            for page in pages:
+                figure, grid = plt.subplots(rows, columns, figsize=(columns*cell_size, rows*cell_size), dpi=dpi, squeeze=False)
+                try:
+                    for e, axes in enumerate(grid.flat):
+                        if e < len(page):
+                            shape_name, shape = page[e]
+                            self.__draw_cell__(axes, shape, shape_name, None, show_string_names, vertical)
+                        else:
+                            axes.axis('off')
+                    if pdf is not None:
+                        pdf.savefig(figure, bbox_inches='tight')
+                    else:
+                        figure.savefig(file_name, bbox_inches='tight')
+                finally:
+                    plt.close(figure)
+        finally:
+            if pdf is not None:
+                pdf.close()
+        return len(pages)
+
+    def batch(self, vertical=False, show_string_names=None):
+        """DrawBatch saving many shapes with a single figure, to be closed when done"""
+        return DrawBatch(self, vertical, show_string_names)
+
+    def __draw_cell__(self, axes, shape, shape_name, init_freat, show_string_names, is_vertical=False):
+        """Draw freatboard and fingers of shape on axes"""
         max_f, min_f = shape.get_max_min_freat()
         if init_freat is not None:
-            min_f = init_freat    
-        self.__draw_freatboard_vertical__(axes, max_f - min_f, min_f, shape_name, show_string_names)
+            min_f = init_freat
+        if is_vertical:
+            self.__draw_freatboard_vertical__(axes, max_f - min_f, min_f, shape_name, show_string_names)
+        else:
+            self.__draw_freatboard__(axes, max_f - min_f, min_f, shape_name, show_string_names)
+        self.__draw_fingers__(axes, shape, min_f, is_vertical)
+
+    def __draw_fingers__(self, axes, shape, min_f, is_vertical=False):
+        """Draw the finger circles and texts of shape and return the added artists"""
+        from matplotlib import pyplot as plt
+        artists = []
         for f in shape.fingers:
-            y = (f.freat - min_f)*self.freat_size + self.freat_size/2
-            x = 5*self.string_separation - DrawFreatboard.STRINGS.index(f.string)*self.string_separation
+            x = (f.freat - min_f)*self.freat_size + self.freat_size/2
+            y = 5*self.string_separation - DrawFreatboard.STRINGS.index(f.string)*self.string_separation
+            if is_vertical:
+                x, y = y, x
             if f.function == '1':
                 circle = plt.Circle((x, y), self.freat_size/5, color='r', fill=True, zorder=2)
             else:
                 circle = plt.Circle((x, y), self.freat_size/5, color='k', fill=True, zorder=2)
-            axes.add_artist(circle)
-            self.__add_finger_text__(axes, shape, x, y, f, is_vertical=True)
-        if return_fig:
-            return figure
-        else:
-            plt.show()
-
+            artists.append(axes.add_artist(circle))
+            text = self.__add_finger_text__(axes, shape, x, y, f, is_vertical)
+            if text is not None:
+                artists.append(text)
+        return artists
 
     def __draw_freatboard__(self, axes, freats, init_freat, shape_name, show_string_names):
+        from matplotlib import pyplot as plt
         if freats < self.min_freats:
             freats = self.min_freats
+        artists = []
         for s in range(6): # strings
-            axes.plot([0, freats*self.freat_size + self.freat_size], [s*self.string_separation, s*self.string_separation], '-', color='gray')
+            artists += axes.plot([0, freats*self.freat_size + self.freat_size], [s*self.string_separation, s*self.string_separation], '-', color='gray')
         for f in range(freats + 1): # freats
-            axes.plot([self.freat_size*f, self.freat_size*f], [0, self.string_separation*5], 'k-')
+            artists += axes.plot([self.freat_size*f, self.freat_size*f], [0, self.string_separation*5], 'k-')
         if show_string_names:
             for e, t in enumerate(DrawFreatboard.STRINGS): # string names
-                axes.text(-self.string_separation + (self.string_separation/5), self.string_separation*5-(self.string_separation/10) - e*self.string_separation, t, fontsize=12)
+                artists.append(axes.text(-self.string_separation + (self.string_separation/5), self.string_separation*5-(self.string_separation/10) - e*self.string_separation, t, fontsize=12))
         if init_freat <= 1: # if initial freat draw double line
-            axes.plot([1, 1], [0, self.string_separation*5], 'k-')
+            artists += axes.plot([1, 1], [0, self.string_separation*5], 'k-')
         axes.axis('off')
         
         # Draw freat symbols
@@ -81,37 +144,40 @@ class DrawFreatboard:
                 if s == 12:
                     y = 1.5*self.string_separation
                     circle = plt.Circle((x, y), self.freat_size/10, color='lightgray', fill=True)
-                    axes.add_artist(circle)
+                    artists.append(axes.add_artist(circle))
                     y = 3.5*self.string_separation
                     circle = plt.Circle((x, y), self.freat_size/10, color='lightgray', fill=True)
-                    axes.add_artist(circle)
+                    artists.append(axes.add_artist(circle))
                 else:
                     y = 2.5*self.string_separation
                     circle = plt.Circle((x, y), self.freat_size/10, color='lightgray', fill=True)
-                    axes.add_artist(circle)
+                    artists.append(axes.add_artist(circle))
 
         # Add starting fret
-        plt.text(8, -self.string_separation, str(init_freat), fontsize=12)
+        artists.append(axes.text(8, -self.string_separation, str(init_freat), fontsize=12))
         axes.set_aspect(1)
         axes.set_xlim(-self.freat_size/4, (freats+1)*self.freat_size)
         axes.set_ylim(-self.freat_size, self.string_separation*7)
 
         # Add shape name
         if shape_name is not None:
-            axes.text(0, self.string_separation*6, shape_name, fontsize=12)
+            self.__draw_shape_name__(axes, shape_name)
+        return artists
 
     def __draw_freatboard_vertical__(self, axes, freats, init_freat, shape_name, show_string_names):
+        from matplotlib import pyplot as plt
         if freats < self.min_freats:
             freats = self.min_freats
+        artists = []
         for s in range(6): # strings
-            axes.plot([s*self.string_separation, s*self.string_separation], [0, (freats + 1) * self.freat_size], '-', color='gray')
+            artists += axes.plot([s*self.string_separation, s*self.string_separation], [0, (freats + 1) * self.freat_size], '-', color='gray')
         for f in range(freats + 1): # freats
-            axes.plot([0, self.string_separation*5], [self.freat_size*f, self.freat_size*f], 'k-')
+            artists += axes.plot([0, self.string_separation*5], [self.freat_size*f, self.freat_size*f], 'k-')
         if show_string_names:
             for e, t in enumerate(DrawFreatboard.STRINGS_REVERSE): # string names
-                axes.text(e*self.string_separation - 2 , -2, t, fontsize=12)
+                artists.append(axes.text(e*self.string_separation - 2 , -2, t, fontsize=12))
         if init_freat <= 1: # if initial freat draw double line
-            axes.plot([0, self.string_separation*5], [1, 1], 'k-')
+            artists += axes.plot([0, self.string_separation*5], [1, 1], 'k-')
         axes.axis('off')
         
         # Draw freat symbols
@@ -122,26 +188,31 @@ class DrawFreatboard:
                 if s == 12:
                     x = 1.5*self.string_separation
                     circle = plt.Circle((x, y), self.freat_size/10, color='lightgray', fill=True)
-                    axes.add_artist(circle)
+                    artists.append(axes.add_artist(circle))
                     x = 3.5*self.string_separation
                     circle = plt.Circle((x, y), self.freat_size/10, color='lightgray', fill=True)
-                    axes.add_artist(circle)
+                    artists.append(axes.add_artist(circle))
                 else:
                     x = 2.5*self.string_separation
                     circle = plt.Circle((x, y), self.freat_size/10, color='lightgray', fill=True)
-                    axes.add_artist(circle)
+                    artists.append(axes.add_artist(circle))
 
         # Add starting fret
-        plt.text(-self.string_separation, self.freat_size/2, str(init_freat), fontsize=12)
+        artists.append(axes.text(-self.string_separation, self.freat_size/2, str(init_freat), fontsize=12))
         axes.set_aspect(1)
         axes.set_xlim(-self.string_separation, self.string_separation*7)
         axes.set_ylim((freats+1)*self.freat_size, -self.freat_size/4)
     
         # Add shape name
         if shape_name is not None:
-            axes.text(self.string_separation*2, -self.freat_size/2, shape_name, fontsize=12)
-            
-    
+            self.__draw_shape_name__(axes, shape_name, is_vertical=True)
+        return artists
+
+    def __draw_shape_name__(self, axes, shape_name, is_vertical=False):
+        if is_vertical:
+            return axes.text(self.string_separation*2, -self.freat_size/2, shape_name, fontsize=12)
+        return axes.text(0, self.string_separation*6, shape_name, fontsize=12)
+
     def __add_finger_text__(self, axes, shape, x, y, f, is_vertical=False):
         if is_vertical:
             y_offset = -1.5
@@ -150,17 +221,106 @@ class DrawFreatboard:
 
         if self.text == DrawFreatboard.TEXT_FUNCTION:
             if len(f.function) == 2:
-                axes.text(x-2.75, y-y_offset, f.function, fontsize=12, color='white')
+                return axes.text(x-2.75, y-y_offset, f.function, fontsize=12, color='white')
             else:
-                axes.text(x-1.75, y-y_offset, f.function, fontsize=12, color='white')
+                return axes.text(x-1.75, y-y_offset, f.function, fontsize=12, color='white')
         elif self.text == DrawFreatboard.TEXT_FINGER:
             if len(f.finger) == 2:
-                axes.text(x-2.75, y-y_offset, f.finger, fontsize=12, color='white')
+                return axes.text(x-2.75, y-y_offset, f.finger, fontsize=12, color='white')
             else:
-                axes.text(x-1.75, y-y_offset, f.finger, fontsize=12, color='white')
+                return axes.text(x-1.75, y-y_offset, f.finger, fontsize=12, color='white')
         elif self.text == DrawFreatboard.TEXT_NOTE:
             note = DrawFreatboard.NOTE_NAME[f.semitone]
             if len(note) == 2:
-                axes.text(x-2.75, y-y_offset, note, fontsize=12, color='white')
+                return axes.text(x-2.75, y-y_offset, note, fontsize=12, color='white')
             else:
-                axes.text(x-1.75, y-y_offset, note, fontsize=12, color='white')
+                return axes.text(x-1.75, y-y_offset, note, fontsize=12, color='white')
+
+
+class DrawBatch:
+    """Save many shapes reusing a single figure.
+
+    The freatboard background is drawn once per freat window (number of freats and
+    initial freat) and kept hidden while other windows are in use, so every shape only
+    adds its finger circles, texts and name, which are removed once saved. Figures
+    returned by DrawFreatboard.draw_shape are never closed by this class; the batch
+    figure is closed by close() or when leaving a with block.
+    """
+
+    def __init__(self, draw, vertical=False, show_string_names=None, dpi=80):
+        from matplotlib import pyplot as plt
+        self.draw = draw
+        self.vertical = vertical
+        self.show_string_names = not vertical if show_string_names is None else show_string_names
+        self.figure, self.axes = plt.subplots(dpi=dpi)
+        self.backgrounds = {}
+        self.window = None
+
+    @instrumented('save_shape', key=lambda self, shape, file_name, text=1, shape_name=None, *args, **kwargs: shape_name)
+    def save(self, shape, file_name, text=1, shape_name=None, init_freat=None, **kwargs):
+        """Draw shape like DrawFreatboard.draw_shape (or draw_shape_vertical) and save it to file_name"""
+        self.draw.text = text
+        max_f, min_f = shape.get_max_min_freat()
+        if init_freat is not None:
+            min_f = init_freat
+        self.__set_window__(max(max_f - min_f, self.draw.min_freats), min_f)
+        artists = self.draw.__draw_fingers__(self.axes, shape, min_f, self.vertical)
+        if shape_name is not None:
+            artists.append(self.draw.__draw_shape_name__(self.axes, shape_name, self.vertical))
+        kwargs.setdefault('bbox_inches', 'tight')
+        try:
+            self.figure.savefig(file_name, **kwargs)
+        finally:
+            for a in artists:
+                a.remove()
+
+    def save_all(self, jobs):
+        """Save the (shape, file_name, shape_name) jobs, returning the (file_name, error) of the failed ones"""
+        errors = []
+        for shape, file_name, shape_name in jobs:
+            try:
+                self.save(shape, file_name, shape_name=shape_name)
+            except Exception as e:
+                errors.append((file_name, "{}: {}".format(type(e).__name__, e)))
+        return errors
+
+    @staticmethod
+    def save_packed(jobs, vertical=False):
+        """save_all for jobs with packed shapes (see Shape.pack), used by process pools"""
+        import matplotlib
+        matplotlib.use('Agg')
+        from PyFreatboard.shape import Shape
+        with DrawFreatboard().batch(vertical=vertical) as batch:
+            return batch.save_all([(Shape.unpack(data), file_name, shape_name) for data, file_name, shape_name in jobs])
+
+    def close(self):
+        from matplotlib import pyplot as plt
+        plt.close(self.figure)
+        self.backgrounds.clear()
+
+    def __set_window__(self, freats, init_freat):
+        window = (freats, init_freat)
+        if window == self.window:
+            return
+        if self.window is not None:
+            for a in self.backgrounds[self.window][0]:
+                a.set_visible(False)
+        if window in self.backgrounds:
+            artists, xlim, ylim = self.backgrounds[window]
+            for a in artists:
+                a.set_visible(True)
+            self.axes.set_xlim(xlim)
+            self.axes.set_ylim(ylim)
+        else:
+            if self.vertical:
+                artists = self.draw.__draw_freatboard_vertical__(self.axes, freats, init_freat, None, self.show_string_names)
+            else:
+                artists = self.draw.__draw_freatboard__(self.axes, freats, init_freat, None, self.show_string_names)
+            self.backgrounds[window] = (artists, self.axes.get_xlim(), self.axes.get_ylim())
+        self.window = window
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+from PyFreatboard.draw_freatboard import DrawFreatboard, _shape_key
+from PyFreatboard.instrumentation import instrumented
+
+
+class DrawFreatboardSVG:
+    """Draw shapes as SVG strings without matplotlib.
+
+    Uses the same geometry (min_freats, freat_size, string_separation), strings and text
+    modes than DrawFreatboard, but not its matplotlib methods (draw_sheet, batch), and
+    draw_shape returns the SVG instead of a figure. Coordinates are the matplotlib data
+    coordinates, flipped vertically for the horizontal layout, and scale is the number of
+    pixels per unit. The freatboard backgrounds of the last max_backgrounds freat windows
+    are kept and reused.
+    """
+    FONT_SIZE = 12*80/72 # 12 points at 80 dpi, in pixels
+    LINE_WIDTH = 1.5*80/72
+
+    def __init__(self, min_freats=3, freat_size=20, string_separation=10, scale=4, max_backgrounds=64):
+        self.min_freats = min_freats
+        self.freat_size = freat_size
+        self.string_separation = string_separation
+        self.scale = scale
+        self.max_backgrounds = max_backgrounds
+        self.backgrounds = OrderedDict()
+
+    @instrumented('draw_svg', key=_shape_key)
+    def draw_shape(self, shape, text=1, shape_name=None, init_freat=None, show_string_names=True):
+        return self.__svg__(shape, text, shape_name, init_freat, show_string_names, False)
+
+    @instrumented('draw_svg', key=_shape_key)
+    def draw_shape_vertical(self, shape, text=1, shape_name=None, init_freat=None, show_string_names=False):
+        return self.__svg__(shape, text, shape_name, init_freat, show_string_names, True)
+
+    def save_shape(self, shape, file_name, vertical=False, **kwargs):
+        """Write the SVG of shape to file_name, kwargs as in draw_shape"""
+        svg = self.draw_shape_vertical(shape, **kwargs) if vertical else self.draw_shape(shape, **kwargs)
+        with open(file_name, 'w') as f:
+            f.write(svg)
+
+    def __svg__(self, shape, text, shape_name, init_freat, show_string_names, is_vertical):
+        max_f, min_f = shape.get_max_min_freat()
+        if init_freat is not None:
+            min_f = init_freat
+        freats = max(max_f - min_f, self.min_freats)
+        key = (freats, min_f, show_string_names, is_vertical)
+        if key in self.backgrounds:
+            self.backgrounds.move_to_end(key)
+        else:
+            self.backgrounds[key] = self.__background__(freats, min_f, show_string_names, is_vertical)
+            while len(self.backgrounds) > self.max_backgrounds:
+                self.backgrounds.popitem(last=False)
+        header, background = self.backgrounds[key]
+        parts = [header, background]
+        flip = 1 if is_vertical else -1
+        font = self.FONT_SIZE/self.scale
+        for f in shape.fingers:
+            x = (f.freat - min_f)*self.freat_size + self.freat_size/2
+            y = 5*self.string_separation - DrawFreatboard.STRINGS.index(f.string)*self.string_separation
+            if is_vertical:
+                x, y = y, x
+            color = 'red' if f.function == '1' else 'black'
+            parts.append('<circle cx="{:g}" cy="{:g}" r="{:g}" fill="{}"/>'.format(x, flip*y, self.freat_size/5, color))
+            label = self.__finger_label__(f, text)
+            if label:
+                dx = 2.75 if len(label) == 2 else 1.75
+                parts.append('<text x="{:g}" y="{:g}" font-size="{:g}" fill="white">{}</text>'.format(x - dx, flip*y + 1.5, font, escape(label)))
+        if shape_name is not None:
+            if is_vertical:
+                x, y = self.string_separation*2, -self.freat_size/2
+            else:
+                x, y = 0, -self.string_separation*6
+            parts.append('<text x="{:g}" y="{:g}" font-size="{:g}">{}</text>'.format(x, y, font, escape(shape_name)))
+        parts.append('</svg>\n')
+        return ''.join(parts)
+
+    @staticmethod
+    def __finger_label__(f, text):
+        if text == DrawFreatboard.TEXT_FUNCTION:
+            return f.function
+        elif text == DrawFreatboard.TEXT_FINGER:
+            return f.finger
+        elif text == DrawFreatboard.TEXT_NOTE:
+            return DrawFreatboard.NOTE_NAME[f.semitone]
+        return None
+
+    def __background__(self, freats, init_freat, show_string_names, is_vertical):
+        """SVG header and static elements (strings, freats, symbols, names) of a freat window"""
+        fs = self.freat_size
+        ss = self.string_separation
+        lines = [] # (x0, y0, x1, y1, color) in SVG coordinates
+        symbols = [] # (x, y)
+        texts = [] # (x, y, text)
+        freat_symbols = [3, 5, 7, 9, 12, 15, 17]
+        if is_vertical:
+            for s in range(6): # strings
+                lines.append((s*ss, 0, s*ss, (freats + 1)*fs, 'gray'))
+            for f in range(freats + 1): # freats
+                lines.append((0, fs*f, ss*5, fs*f, 'black'))
+            if show_string_names:
+                for e, t in enumerate(DrawFreatboard.STRINGS_REVERSE):
+                    texts.append((e*ss - 2, -2, t))
+            if init_freat <= 1: # if initial freat draw double line
+                lines.append((0, 1, ss*5, 1, 'black'))
+            for s in freat_symbols:
+                if (s - init_freat) >= 0 and (s - init_freat) < (freats + 1):
+                    y = (s - init_freat)*fs + fs/2
+                    xs = [1.5*ss, 3.5*ss] if s == 12 else [2.5*ss]
+                    symbols += [(x, y) for x in xs]
+            texts.append((-ss, fs/2, str(init_freat)))
+            view = (-ss, -fs, ss*8, (freats + 2)*fs)
+        else:
+            for s in range(6): # strings
+                lines.append((0, -s*ss, freats*fs + fs, -s*ss, 'gray'))
+            for f in range(freats + 1): # freats
+                lines.append((fs*f, 0, fs*f, -ss*5, 'black'))
+            if show_string_names:
+                for e, t in enumerate(DrawFreatboard.STRINGS):
+                    texts.append((-ss + ss/5, -(ss*5 - ss/10 - e*ss), t))
+            if init_freat <= 1: # if initial freat draw double line
+                lines.append((1, 0, 1, -ss*5, 'black'))
+            for s in freat_symbols:
+                x = (s - init_freat)*fs + fs/2
+                if x > 0 and x < (freats + 1)*fs:
+                    ys = [1.5*ss, 3.5*ss] if s == 12 else [2.5*ss]
+                    symbols += [(x, -y) for y in ys]
+            texts.append((8, ss, str(init_freat)))
+            x0 = -ss if show_string_names else -fs/4
+            view = (x0, -ss*7, (freats + 1)*fs - x0, ss*7 + fs)
+
+        header = '<svg xmlns="http://www.w3.org/2000/svg" width="{:g}" height="{:g}" viewBox="{:g} {:g} {:g} {:g}" font-family="DejaVu Sans, sans-serif">'.format(
+            view[2]*self.scale, view[3]*self.scale, *view)
+        # freat symbols go below the lines, as in matplotlib
+        parts = ['<circle cx="{:g}" cy="{:g}" r="{:g}" fill="lightgray"/>'.format(x, y, fs/10) for x, y in symbols]
+        parts.append('<g stroke-width="{:g}">'.format(self.LINE_WIDTH/self.scale))
+        parts += ['<line x1="{:g}" y1="{:g}" x2="{:g}" y2="{:g}" stroke="{}"/>'.format(*l) for l in lines]
+        parts.append('</g>')
+        font = self.FONT_SIZE/self.scale
+        parts += ['<text x="{:g}" y="{:g}" font-size="{:g}">{}</text>'.format(x, y, font, t) for x, y, t in texts]
+        return header, ''.join(parts)
@@ -5,21 +5,108 @@ class Finger:
 
     guitar_strings = ['e', 'B', 'G', 'D', 'A', 'E']
     strings_semitones = [24, 19, 15, 10, 5, 0]
+    STRING_SEMITONES = dict(zip(guitar_strings, strings_semitones))
+
+    # Small integer codes used by the packed shape representation
+    STRING_CODES = dict(zip(guitar_strings, range(len(guitar_strings))))
+    FUNCTIONS = list(INTERVALS)
+    FUNCTION_CODES = dict(zip(FUNCTIONS, range(len(FUNCTIONS))))
+    FINGERS = [None, '', '1', '2', '3', '4', '1s', '4s']
+    FINGER_CODES = dict(zip(FINGERS, range(len(FINGERS))))
+
+    __slots__ = ('semitone', 'function', 'string', 'freat', 'finger', 'fingered')
 
     def __init__(self, semitone, function, string, freat, finger=""):
-        self.semitone = semitone
-        self.function = function
-        self.string = string
-        self.freat = freat
-        self.finger = finger
+        # Fingers are shared by all the shapes using them, so they are read only once created
+        set_attribute = object.__setattr__
+        set_attribute(self, 'semitone', semitone)
+        set_attribute(self, 'function', function)
+        set_attribute(self, 'string', string)
+        set_attribute(self, 'freat', freat)
+        set_attribute(self, 'finger', finger)
+        set_attribute(self, 'fingered', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Finger is read only, use with_finger to change its fingering")
+
+    def __delattr__(self, name):
+        raise AttributeError("Finger is read only")
+
+    def __reduce__(self):
+        return Finger, (self.semitone, self.function, self.string, self.freat, self.finger)
+
+    def with_finger(self, finger):
+        """Copy of this finger with the given fingering, created once and shared"""
+        if finger == self.finger:
+            return self
+        if self.fingered is None:
+            object.__setattr__(self, 'fingered', {})
+        if finger not in self.fingered:
+            self.fingered[finger] = Finger(self.semitone, self.function, self.string, self.freat, finger)
+        return self.fingered[finger]
         
+    def get_codes(self):
+        """(string, freat, function, finger) integer codes"""
+        return Finger.STRING_CODES[self.string], self.freat, Finger.FUNCTION_CODES[self.function], Finger.FINGER_CODES[self.finger]
+
+    @staticmethod
+    def from_codes(string, freat, function, finger):
+        string = Finger.guitar_strings[string]
+        semitone = (Finger.NOTES[string.upper()] + freat) % 12
+        return Finger(semitone, Finger.FUNCTIONS[function], string, freat, Finger.FINGERS[finger])
+
+    def get_pitch(self):
+        """Absolute pitch in semitones above the open low E string"""
+        return Finger.STRING_SEMITONES[self.string] + self.freat
+
     def dist(self, f):
-        s_num = Finger.guitar_strings.index(self.string)
-        f_num = Finger.guitar_strings.index(f.string)
-        return (Finger.strings_semitones[s_num] + self.freat) - (Finger.strings_semitones[f_num] + f.freat)
+        return self.get_pitch() - f.get_pitch()
         
+    def get_key(self):
+        """Hashable key with the attributes used to compare fingers"""
+        return self.string, self.freat, self.finger
+
     def __eq__(self, f):
         return self.freat == f.freat and self.string == f.string and self.finger == f.finger
 
+    def __hash__(self):
+        return hash(self.get_key())
+
     def __str__(self):
         return "{} ({}) --> [{}/{}]({})".format(self.semitone, self.function, self.string, self.freat, self.finger)
+
+
+
+class FingerIndex:
+    """Fingers indexed by string and by (function, absolute pitch), keeping their original order"""
+
+    def __init__(self, fingers):
+        self.fingers = fingers
+        self.by_string = {}
+        self.by_pitch = {}
+        self.semitones = {}
+        for f in fingers:
+            self.by_string.setdefault(f.string, []).append(f)
+            self.by_pitch.setdefault((f.function, f.get_pitch()), []).append(f)
+            self.semitones[f.function] = f.semitone
+
+    def on_string(self, string):
+        return self.by_string.get(string, [])
+
+    def find(self, function, pitch, string):
+        """Finger playing function at the absolute pitch on string, None if it is not on the freatboard"""
+        for f in self.by_pitch.get((function, pitch), []):
+            if f.string == string:
+                return f
+        return None
+
+    def next_fingers(self, function, last):
+        """Fingers playing function less than an octave above last and less than 5 freats away"""
+        if function not in self.semitones:
+            return []
+        # Only one pitch of a given pitch class lies strictly inside (last, last + 12)
+        interval = (self.semitones[function] - last.semitone) % 12
+        if interval == 0:
+            return []
+        candidates = self.by_pitch.get((function, last.get_pitch() + interval), [])
+        return [f for f in candidates if abs(f.freat - last.freat) < 5]
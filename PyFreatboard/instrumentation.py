@@ -0,0 +1,113 @@
+import json
+from functools import wraps
+from time import perf_counter
+
+
+class PhaseStats:
+    """Calls, time in seconds and items produced by a phase, in total and per key"""
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.items = 0
+        self.keys = {} # key: [calls, time, items]
+
+    def add(self, key, elapsed, items):
+        self.calls += 1
+        self.time += elapsed
+        self.items += items
+        if key is not None:
+            stats = self.keys.setdefault(key, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += items
+
+    def to_dict(self):
+        return {'calls': self.calls, 'time': self.time, 'items': self.items,
+                'keys': {str(k): {'calls': c, 'time': t, 'items': i} for k, (c, t, i) in self.keys.items()}}
+
+
+class Instrumentation:
+    """Timings and counters of the instrumented phases, recorded only while enabled.
+
+    Times are inclusive: a phase called from another one (fill_shape from
+    scale_to_freatboard) is also counted in the outer phase. Phases without a key
+    function (set_fingering, filter_shapes) are recorded with the key of the closest
+    enclosing phase, so they are also broken down by chord or scale.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}
+        self.keys = [] # keys of the phases being run
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.phases = {}
+
+    def record(self, phase, key, elapsed, items=0):
+        if phase not in self.phases:
+            self.phases[phase] = PhaseStats()
+        self.phases[phase].add(key, elapsed, items)
+
+    def to_dict(self):
+        return {phase: stats.to_dict() for phase, stats in self.phases.items()}
+
+    def save(self, file_name):
+        """Export the recorded stats as JSON"""
+        with open(file_name, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def report(self, top_keys=5):
+        """Text report of the phases sorted by time, with the top_keys most expensive keys of each"""
+        lines = ["{:<24}{:>10}{:>12}{:>10}".format('phase', 'calls', 'time ms', 'items')]
+        for phase, stats in sorted(self.phases.items(), key=lambda p: -p[1].time):
+            lines.append("{:<24}{:>10}{:>12.2f}{:>10}".format(phase, stats.calls, 1000*stats.time, stats.items))
+            for key, (calls, elapsed, items) in sorted(stats.keys.items(), key=lambda k: -k[1][1])[:top_keys]:
+                lines.append("  {:<22}{:>10}{:>12.2f}{:>10}".format(str(key), calls, 1000*elapsed, items))
+        return "\n".join(lines)
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+def instrumented(phase, key=None, count=None):
+    """Decorator recording the calls of a function in INSTRUMENTATION as phase.
+
+    key(*args, **kwargs) gives the key of the call for the per key breakdown, the key
+    of the enclosing phase is used without it, and count(result) the number of items
+    it produced. When INSTRUMENTATION is disabled the only cost is a call and a flag check.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION.enabled:
+                return function(*args, **kwargs)
+            keys = INSTRUMENTATION.keys
+            if key is not None:
+                call_key = key(*args, **kwargs)
+            else:
+                call_key = keys[-1] if keys else None
+            keys.append(call_key)
+            t0 = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                keys.pop()
+            elapsed = perf_counter() - t0
+            INSTRUMENTATION.record(phase, call_key, elapsed, count(result) if count is not None else 0)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+from PyFreatboard.finger import Finger
+
+
+class MelodyPosition:
+    """Note of a melody placed on the freatboard. finger is the shape fingering, or '1' ('' on open strings) outside shapes"""
+
+    def __init__(self, note, string, freat, finger, in_shape):
+        self.note = note
+        self.string = string
+        self.freat = freat
+        self.finger = finger
+        self.in_shape = in_shape
+
+    def __str__(self):
+        return "{} {}{}({})".format(self.note, self.string, self.freat, self.finger)
+
+
+def __freatboard_positions__(max_freat):
+    positions = {}
+    for string in Finger.guitar_strings:
+        for freat in range(max_freat + 1):
+            positions.setdefault(Finger.STRING_SEMITONES[string] + freat, []).append((string, freat))
+    return positions
+
+
+class MelodyMapper:
+    """Place the notes of a song melody on strings and freats following the chord shapes.
+
+    The candidates of a note are the fingers of the valid arpeggio shapes of its chord
+    (and scale shapes of its section if scales) with the same pitch, each with the lowest
+    freat of its shape as hand position. Notes out of every shape can be played anywhere
+    in POSITIONS at a cost of out_of_shape. Changing the hand position costs movement per
+    freat. Positions are chosen by dynamic programming over the notes of a chord, starting
+    from the hand position of the previous chord, so chords are yielded one by one and
+    only one chord is kept in memory.
+    """
+    MAX_FREAT = 17
+    LOW_E = 40 # MIDI number of the open low E string (E2)
+    PITCH_CLASSES = dict(Finger.NOTES, **{'Db': 1, 'D#': 3, 'Gb': 6, 'Ab': 8, 'A#': 10, 'Cb': 11, 'B#': 0, 'E#': 5, 'Fb': 4})
+    # pitch (semitones above the open low E string): [(string, freat)]
+    POSITIONS = __freatboard_positions__(MAX_FREAT)
+
+    def __init__(self, song, movement=1.0, out_of_shape=3.0, scales=True):
+        self.song = song
+        self.movement = movement
+        self.out_of_shape = out_of_shape
+        self.scales = scales
+
+    def iter_melody(self, melody_id):
+        """Yield (chord, positions) for every chord with notes in melody_id, positions is a list of MelodyPosition (None if unplayable)"""
+        hand = None
+        for section in self.song.sections:
+            for chord in section.chords:
+                notes = chord.melody.get(melody_id)
+                if not notes:
+                    continue
+                shapes = list(self.song.get_arpeggios()[chord.root + chord.type])
+                if self.scales:
+                    shapes += self.song.get_scales()[section.root + section.type]
+                positions, hand = self.__map_chord__(notes, shapes, hand)
+                yield chord, positions
+
+    def get_positions(self, melody_id):
+        """MelodyPosition of every note of melody_id"""
+        return [p for _, positions in self.iter_melody(melody_id) for p in positions]
+
+    @staticmethod
+    def get_pitch(note):
+        """Pitch of note in semitones above the open low E string"""
+        return 12*(note.octave + 1) + MelodyMapper.PITCH_CLASSES[note.pitch] - MelodyMapper.LOW_E
+
+    def __map_chord__(self, notes, shapes, hand):
+        table = {}
+        for shape in shapes:
+            if shape.valid:
+                shape_hand = shape.get_max_min_freat()[1]
+                for f in shape.fingers:
+                    table.setdefault(f.get_pitch(), set()).add((f.string, f.freat, f.finger, shape_hand))
+
+        # costs and back pointers of the candidates of every note
+        steps = []
+        previous = None if hand is None else [(None, None, None, hand)]
+        costs = [0.0] if hand is not None else None
+        for note in notes:
+            pitch = MelodyMapper.get_pitch(note)
+            # lowest hand positions first, so they win ties
+            candidates = [c + (True,) for c in sorted(table.get(pitch, ()), key=lambda c: (c[3], c[1], Finger.STRING_CODES[c[0]]))]
+            if not candidates:
+                candidates = [(s, f, '1' if f > 0 else '', max(f - 1, 0), False) for s, f in MelodyMapper.POSITIONS.get(pitch, [])]
+            if not candidates:
+                steps.append((note, None, None))
+                continue
+            new_costs = []
+            back = []
+            for c in candidates:
+                penalty = 0 if c[4] else self.out_of_shape
+                if previous is None:
+                    new_costs.append(penalty)
+                    back.append(None)
+                else:
+                    best = min(range(len(previous)), key=lambda k: costs[k] + self.movement*abs(previous[k][3] - c[3]))
+                    new_costs.append(costs[best] + self.movement*abs(previous[best][3] - c[3]) + penalty)
+                    back.append(best)
+            steps.append((note, candidates, back))
+            previous, costs = candidates, new_costs
+
+        positions = [None]*len(notes)
+        if costs is None or previous is None or previous[0][0] is None:
+            return positions, hand
+        best = min(range(len(costs)), key=costs.__getitem__)
+        last_hand = previous[best][3]
+        for i in range(len(steps) - 1, -1, -1):
+            note, candidates, back = steps[i]
+            if candidates is None:
+                continue
+            string, freat, finger, _, in_shape = candidates[best]
+            positions[i] = MelodyPosition(note, string, freat, finger, in_shape)
+            best = back[best]
+        return positions, last_hand
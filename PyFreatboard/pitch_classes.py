@@ -0,0 +1,91 @@
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+
+
+class PitchClassIndex:
+    """12 bit pitch class masks of every root and BuildShape.SHAPES type.
+
+    Bit n of a mask is set when the shape has the note n semitones above C. by_mask is
+    the inverted index from a mask to the (root, type) keys with exactly those notes.
+    Queries for keys containing, or contained in, a mask are computed once per mask and
+    types and then memoized, so repeated queries are dictionary lookups.
+    """
+    # Types with less notes are chords, the others scales
+    SCALE_NOTES = 5
+
+    def __init__(self):
+        shapes = BuildShape.SHAPES
+        self.masks = {}
+        self.by_mask = {}
+        for shape_type in shapes:
+            for root in Finger.NOTES:
+                notes, _ = BuildShape.notes_and_harmony(root, shape_type)
+                mask = PitchClassIndex.get_mask(notes)
+                self.masks[(root, shape_type)] = mask
+                self.by_mask.setdefault(mask, []).append((root, shape_type))
+        self.scale_types = [t for t in shapes if len(shapes[t]) >= PitchClassIndex.SCALE_NOTES]
+        self.chord_types = [t for t in shapes if len(shapes[t]) < PitchClassIndex.SCALE_NOTES]
+        self.supersets = {}
+        self.subsets = {}
+
+    @staticmethod
+    def get_mask(semitones):
+        """Mask of a list of semitones (any octave)"""
+        mask = 0
+        for n in semitones:
+            mask |= 1 << (n % 12)
+        return mask
+
+    @staticmethod
+    def get_fingers_mask(fingers):
+        """Mask of the notes of a list of Finger objects, or (string, freat) pairs"""
+        mask = 0
+        for f in fingers:
+            if isinstance(f, tuple):
+                string, freat = f
+                mask |= 1 << ((Finger.NOTES[string.upper()] + freat) % 12)
+            else:
+                mask |= 1 << f.semitone
+        return mask
+
+    def get(self, root, shape_type):
+        return self.masks[(root, shape_type)]
+
+    def find(self, mask):
+        """Keys with exactly the notes of mask"""
+        return self.by_mask.get(mask, [])
+
+    def find_fingers(self, fingers):
+        """Keys with exactly the notes played by fingers, see get_fingers_mask"""
+        return self.find(PitchClassIndex.get_fingers_mask(fingers))
+
+    def containing(self, mask, types=None):
+        """Keys (of types, all by default) with all the notes of mask, like the scales of a chord"""
+        query = (mask, None if types is None else tuple(types))
+        if query not in self.supersets:
+            self.supersets[query] = [k for k, m in self.__masks__(types) if m & mask == mask]
+        return self.supersets[query]
+
+    def contained(self, mask, types=None):
+        """Keys (of types, all by default) whose notes are all in mask, like the chords of a scale"""
+        query = (mask, None if types is None else tuple(types))
+        if query not in self.subsets:
+            self.subsets[query] = [k for k, m in self.__masks__(types) if m & mask == m]
+        return self.subsets[query]
+
+    def get_scales(self, root, chord_type):
+        """Scales containing the chord"""
+        return self.containing(self.get(root, chord_type), self.scale_types)
+
+    def get_chords(self, root, scale_type):
+        """Chords within the scale"""
+        return self.contained(self.get(root, scale_type), self.chord_types)
+
+    def __masks__(self, types):
+        if types is None:
+            return self.masks.items()
+        types = set(types)
+        return [(k, m) for k, m in self.masks.items() if k[1] in types]
+
+
+PITCH_CLASSES = PitchClassIndex()
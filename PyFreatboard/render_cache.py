@@ -0,0 +1,91 @@
+import hashlib
+import os
+import shutil
+
+
+class RenderCache:
+    """On disk cache of rendered diagrams keyed by the content of the shape and the render parameters.
+
+    Files are stored as <key>.<extension> in directory. Hits refresh the modification
+    time of the cached file and, when the total size goes above max_bytes, the least
+    recently used files are removed. With link=True cached files are hard linked instead
+    of copied when possible.
+    """
+
+    def __init__(self, directory, max_bytes=256*2**20, link=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+    @staticmethod
+    def key(shape, shape_name=None, vertical=False, text=1, init_freat=None, draw=None, extension='png'):
+        """Stable hash of the shape fingers (functions and fingering included) and render parameters"""
+        if draw is not None:
+            geometry = (draw.min_freats, draw.freat_size, draw.string_separation)
+        else:
+            geometry = (3, 20, 10)
+        params = repr((shape_name, bool(vertical), text, init_freat, geometry, extension)).encode()
+        return hashlib.sha1(shape.pack() + b'\0' + params).hexdigest() + '.' + extension
+
+    def fetch(self, key, file_name):
+        """Copy the cached key to file_name, returns False if it is not in the cache"""
+        cached = os.path.join(self.directory, key)
+        try:
+            os.utime(cached)
+            self.__place__(cached, file_name)
+        except OSError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, file_name):
+        """Add the rendered file_name to the cache as key"""
+        cached = os.path.join(self.directory, key)
+        if os.path.exists(cached):
+            self.size -= os.path.getsize(cached)
+            os.remove(cached)
+        shutil.copyfile(file_name, cached)
+        self.size += os.path.getsize(cached)
+        if self.size > self.max_bytes:
+            self.__evict__()
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __place__(self, cached, file_name):
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        if self.link:
+            try:
+                os.link(cached, file_name)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(cached, file_name)
+
+    def __evict__(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+        entries.sort()
+        for _, name, size in entries:
+            if self.size <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            self.size -= size
+            self.evictions += 1
+
+    def __str__(self):
+        return "hits: {}, misses: {}, evictions: {}, size: {:.1f} MB".format(self.hits, self.misses, self.evictions, self.size/2**20)
@@ -1,87 +1,117 @@
-import copy
-from PyFreatboard.draw_freatboard import DrawFreatboard
+from array import array
+from PyFreatboard.finger import Finger
+from PyFreatboard.instrumentation import instrumented
 
 class Shape:
+    # index: number of the shape in diagram file names, None to use its position in the list
+    __slots__ = ('fingers', 'valid', 'index')
+
     def __init__(self, fingers):
         self.fingers = fingers
         self.valid = True
+        self.index = None
 
     def __add__(self, a):
         return Shape(self.fingers + a)
 
-    def get_max_min_freat(self):
-        min_f = 100
-        max_f = -100
+    def pack(self):
+        """Compact bytes form: valid flag followed by (string, freat, function, finger) codes per finger.
+
+        Semitones are not stored, they are recovered from the string and freat when unpacking.
+        """
+        codes = [int(self.valid)]
         for f in self.fingers:
-            min_f = min(min_f, f.freat)
-            max_f = max(max_f, f.freat)
-        return max_f, min_f
+            codes.extend(f.get_codes())
+        return array('b', codes).tobytes()
+
+    @staticmethod
+    def unpack(data, transpose=0):
+        """Shape from its packed form, optionally moving all fingers transpose freats"""
+        codes = array('b', data)
+        shape = Shape([Finger.from_codes(codes[i], codes[i + 1] + transpose, codes[i + 2], codes[i + 3]) for i in range(1, len(codes), 4)])
+        shape.valid = bool(codes[0])
+        return shape
+
+    def get_key(self):
+        """Hashable key of the shape, equal for shapes with equal fingers"""
+        return tuple(f.get_key() for f in self.fingers)
 
+    def get_max_min_freat(self):
+        freats = [f.freat for f in self.fingers]
+        return max(freats, default=-100), min(freats, default=100)
+
+    @instrumented('set_fingering')
     def set_fingering(self):
-        self.__set_fingering__(False)
+        """Shape with the fingering of this shape. Fingers are shared, not copied."""
+        fingering = self.__get_fingering__(False)
         if not self.valid:
-            self.__set_fingering__(True)
-        
-        return copy.deepcopy(self)
+            fingering = self.__get_fingering__(True)
 
-    def __set_fingering__(self, priority_4s):
+        shape = Shape([f.with_finger(n) for f, n in zip(self.fingers, fingering)])
+        shape.valid = self.valid
+        return shape
+
+    def __get_fingering__(self, priority_4s):
         self.valid = True
         max_f, min_f = self.get_max_min_freat()
+        fingering = [f.finger for f in self.fingers]
         last_finger = '0'
         
         if max_f - min_f <= 3:
             # one finger per freat
-            for f in self.fingers:
-                f.finger = str(f.freat - min_f + 1)
+            for i, f in enumerate(self.fingers):
+                fingering[i] = str(f.freat - min_f + 1)
 
         elif (max_f - min_f == 4) and priority_4s:
             # 4th finger extension
-            for f in self.fingers:
-                f.finger = str(f.freat - min_f + 1)
-                if f.finger == '5':
-                    f.finger = "4s"
+            for i, f in enumerate(self.fingers):
+                fingering[i] = str(f.freat - min_f + 1)
+                if fingering[i] == '5':
+                    fingering[i] = "4s"
                     if last_finger == '4' or last_finger == '4s' or last_finger == '1s':
                         self.valid = False
-                if f.finger == '1' and last_finger =='1s':
+                if fingering[i] == '1' and last_finger =='1s':
                     self.valid = False
-                last_finger = f.finger
+                last_finger = fingering[i]
         
         elif (max_f - min_f == 4) and not priority_4s:
             # 4th finger extension
-            for f in self.fingers:
-                f.finger = str(f.freat - min_f)
-                if f.finger == '0':
-                    f.finger = "1s"
+            for i, f in enumerate(self.fingers):
+                fingering[i] = str(f.freat - min_f)
+                if fingering[i] == '0':
+                    fingering[i] = "1s"
                     if last_finger == '1' or last_finger == '1s' or last_finger == '4s':
                         self.valid = False
-                if f.finger == '1' and last_finger =='1s':
+                if fingering[i] == '1' and last_finger =='1s':
                     self.valid = False
-                last_finger = f.finger
+                last_finger = fingering[i]
         
         elif max_f - min_f == 5:
             # 4th finger and 1st finger extensions
-            for f in self.fingers:
-                f.finger = str(f.freat - min_f)
-                if f.finger == '5':
-                    f.finger = "4s"
+            for i, f in enumerate(self.fingers):
+                fingering[i] = str(f.freat - min_f)
+                if fingering[i] == '5':
+                    fingering[i] = "4s"
                     if last_finger == '4' or last_finger == '4s' or last_finger == '1s':
                         self.valid = False
-                elif f.finger == '0':
-                    f.finger = '1s'
+                elif fingering[i] == '0':
+                    fingering[i] = '1s'
                     if last_finger == '1' or last_finger == '1s' or last_finger == '4s':
                         self.valid = False
-                if f.finger == '1' and last_finger =='1s':
+                if fingering[i] == '1' and last_finger =='1s':
                     self.valid = False
-                last_finger = f.finger
+                last_finger = fingering[i]
         else:
             self.valid = False
+        return fingering
     
     def get_extensions(self):
         assert len(self.fingers) > 0
-        if self.fingers[0].finger == '':
-            self.set_fingering()
+        fingers = self.fingers
+        if fingers[0].finger == '':
+            fingers = self.set_fingering().fingers
         num_extensions = 0
-        for f in self.fingers:
+        for f in fingers:
             if f.finger == '1s' or f.finger == '4s':
                 num_extensions += 1
         return num_extensions
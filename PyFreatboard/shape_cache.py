@@ -0,0 +1,213 @@
+from collections import OrderedDict
+from os import environ
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger, FingerIndex
+from PyFreatboard.shape import Shape
+from PyFreatboard.instrumentation import instrumented
+
+
+class ShapePatterns:
+    """Root independent shapes of a shape type.
+
+    Scale shapes are searched once for root C on an extended freatboard (freats -11 to 16).
+    Every generated shape keeps a bit mask with the root offsets (0 to 11 semitones)
+    whose real freatboard, freats 0 to 16 once transposed, produces it. The shapes
+    for a root are the transposed patterns whose mask contains its offset, so
+    BuildShape results (including nut and last freat effects) are reproduced exactly.
+    """
+    MAX_FREAT = 16
+    OFFSETS = 12
+
+    def __init__(self, shape_type):
+        self.shape_type = shape_type
+        self.bass_string = 'E'
+        self.notes, self.harmony = BuildShape.notes_and_harmony('C', shape_type)
+        self.patterns = self.__search__(self.notes, self.harmony)
+        self.roots = {}
+
+    def get_shapes(self, root):
+        """New Shape objects for root, equal to the ones generated by BuildShape"""
+        if root not in self.roots:
+            self.roots[root] = [s.pack() for s in self.__build_root__(Finger.NOTES[root])]
+        return [Shape.unpack(data) for data in self.roots[root]]
+
+    def __build_root__(self, offset):
+        bit = 1 << offset
+        shapes = []
+        # Same starting order than BuildShape.__semitone_to_finger__ for this root
+        for n, h in zip(self.notes, self.harmony):
+            freat = (n + offset - Finger.NOTES[self.bass_string.upper()]) % 12
+            starts = [freat, freat + 12] if freat < 5 else [freat]
+            for start in starts:
+                for mask, data in self.patterns.get((h, start - offset), []):
+                    if mask & bit:
+                        shapes.append(Shape.unpack(data, offset))
+        return BuildShape.filter_shapes(shapes)
+
+    @instrumented('shape_patterns', key=lambda self, *args: self.shape_type)
+    def __search__(self, notes, harmony):
+        fingers = []
+        for n, h in zip(notes, harmony):
+            for string in Finger.guitar_strings:
+                for freat in range(1 - ShapePatterns.OFFSETS, ShapePatterns.MAX_FREAT + 1):
+                    if (freat + Finger.NOTES[string.upper()]) % 12 == n:
+                        fingers.append(Finger(n, h, string, freat, None))
+        fingers = FingerIndex(fingers)
+
+        patterns = {}
+        for r in fingers.on_string(self.bass_string):
+            paths = []
+            self.__fill__([r], harmony, (harmony.index(r.function) + 1) % len(harmony), fingers, paths, r.freat, r.freat, ShapePatterns.__window__(r.freat))
+            # Fingering only depends on relative freats, so it is shared by all roots
+            patterns[(r.function, r.freat)] = [(mask, Shape(path).set_fingering().pack()) for mask, path in paths]
+        return patterns
+
+    @instrumented('fill_shape', key=lambda self, *args: self.shape_type)
+    def __fill__(self, path, harmony, pointer, fingers, paths, min_freat, max_freat, live):
+        """BuildShape.fill_shape evaluated at once for all the root offsets in live"""
+        self.__extend__(path, harmony, pointer, fingers, paths, min_freat, max_freat, live)
+
+    def __extend__(self, path, harmony, pointer, fingers, paths, min_freat, max_freat, live):
+        in_window = 0
+        for f in fingers.next_fingers(harmony[pointer], path[-1]):
+            window = live & ShapePatterns.__window__(f.freat)
+            in_window |= window
+            new_min = min(min_freat, f.freat)
+            new_max = max(max_freat, f.freat)
+            nut = ShapePatterns.__nut__(new_min) if new_max - new_min < 5 else 0
+            if window & nut:
+                path.append(f)
+                self.__extend__(path, harmony, (pointer + 1) % len(harmony), fingers, paths, new_min, new_max, window & nut)
+                path.pop()
+            if window & ~nut and path[-1].string == 'e':
+                paths.append((window & ~nut, list(path)))
+        if live & ~in_window:
+            paths.append((live & ~in_window, list(path)))
+
+    @staticmethod
+    def __window__(freat):
+        """Offsets whose freatboard contains freat once transposed"""
+        mask = 0
+        for offset in range(max(0, -freat), min(ShapePatterns.OFFSETS - 1, ShapePatterns.MAX_FREAT - freat) + 1):
+            mask |= 1 << offset
+        return mask
+
+    @staticmethod
+    def __nut__(min_freat):
+        """Offsets for which min_freat is above the nut once transposed"""
+        mask = 0
+        for offset in range(max(0, 1 - min_freat), ShapePatterns.OFFSETS):
+            mask |= 1 << offset
+        return mask
+
+
+class ShapeCache:
+    """Process wide LRU caches of the ShapePatterns of every shape type and of the drop
+    voicings (BuildShape.build_drops) of every root and type, max_size entries each.
+
+    The drop voicings are numbered (Shape.index) with BuildShape.drop_positions, computed
+    once per root, type, drop and bass string and then kept in positions.
+    When catalog (a ShapeCatalog) is set, the shapes it contains are read from it instead,
+    see load_catalog. SHAPE_CACHE loads the catalog file named by the PYFREATBOARD_CATALOG
+    environment variable, if set, when the package is imported.
+    """
+    # Environment variable with the catalog file of SHAPE_CACHE
+    CATALOG_VARIABLE = 'PYFREATBOARD_CATALOG'
+    # Bass strings of the cached drop voicings, the ones of BuildShape.build_drops
+    BASS_STRINGS = ('E', 'A', 'D')
+
+    def __init__(self, max_size=64, catalog=None):
+        self.max_size = max_size
+        self.catalog = catalog
+        self.patterns = OrderedDict()
+        self.voicings = OrderedDict()
+        self.positions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load_catalog(self, file_name):
+        """Read shapes from the ShapeCatalog file_name from now on.
+
+        Also sets PYFREATBOARD_CATALOG, so that worker processes started afterwards (like
+        the ones of DrawBatch.save_packed or SongBook) load it too.
+        """
+        from PyFreatboard.shape_catalog import ShapeCatalog
+        catalog = ShapeCatalog(file_name)
+        if self.catalog is not None:
+            self.catalog.close()
+        self.catalog = catalog
+        environ[ShapeCache.CATALOG_VARIABLE] = file_name
+
+    def get_patterns(self, shape_type):
+        return self.__lookup__(self.patterns, shape_type, lambda: ShapePatterns(shape_type))
+
+    @instrumented('shape_cache', key=lambda self, root, shape_type: root + shape_type, count=len)
+    def get_shapes(self, root, shape_type):
+        """Same shapes than BuildShape(root, shape_type).all_shapes"""
+        if self.catalog is not None and (root, shape_type) in self.catalog:
+            self.hits += 1
+            return self.catalog.get_shapes(root, shape_type)
+        return self.get_patterns(shape_type).get_shapes(root)
+
+    @instrumented('shape_cache_voicings', key=lambda self, root, shape_type: root + shape_type)
+    def get_voicings(self, root, shape_type):
+        """Same voicings than BuildShape(root, shape_type).build_drops(), as new Shape objects"""
+        return {k: [Shape.unpack(data) for data in shapes] for k, shapes in self.__packed_voicings__(root, shape_type).items()}
+
+    @instrumented('shape_cache_drops', key=lambda self, root, shape_type, *args, **kwargs: root + shape_type, count=len)
+    def get_drops(self, root, shape_type, drop=2, bass_string='D'):
+        """Same shapes than BuildShape(root, shape_type).build_drop(drop, bass_string), numbered
+        with get_drop_positions. Empty when the drop does not apply to the shape type.
+        """
+        if drop < 2 or drop >= len(BuildShape.SHAPES[shape_type]):
+            return []
+        if self.catalog is not None and (root, shape_type, 'drop{}'.format(drop), bass_string) in self.catalog:
+            self.hits += 1
+            return self.catalog.get_drops(root, shape_type, drop, bass_string)
+        if bass_string not in ShapeCache.BASS_STRINGS:
+            drops = BuildShape(root, shape_type).build_drop(drop, bass_string)
+        else:
+            matrix = {k: [Shape.unpack(data) for data in shapes] for k, shapes in self.__packed_voicings__(root, shape_type).items() if k[:2] == (drop, bass_string)}
+            drops = BuildShape.drops_from_matrix(matrix, drop, bass_string)
+        for shape, position in zip(drops, self.get_drop_positions(root, shape_type, drop, bass_string)):
+            shape.index = position
+        return drops
+
+    def get_drop_positions(self, root, shape_type, drop=2, bass_string='D'):
+        """BuildShape(root, shape_type).drop_positions(drop, bass_string), computed once"""
+        key = (root, shape_type, drop, bass_string)
+        if key not in self.positions:
+            self.positions[key] = BuildShape(root, shape_type).drop_positions(drop, bass_string)
+        return self.positions[key]
+
+    def __packed_voicings__(self, root, shape_type):
+        return self.__lookup__(self.voicings, (root, shape_type), lambda: ShapeCache.__build_voicings__(root, shape_type))
+
+    def __lookup__(self, cache, key, build):
+        """cache[key], calling build() on a miss and dropping the least recently used entries"""
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+        else:
+            self.misses += 1
+            cache[key] = build()
+            while len(cache) > self.max_size:
+                cache.popitem(last=False)
+        return cache[key]
+
+    @staticmethod
+    def __build_voicings__(root, shape_type):
+        matrix = BuildShape(root, shape_type).build_drops()
+        return {k: [s.pack() for s in shapes] for k, shapes in matrix.items()}
+
+    def clear(self):
+        self.patterns.clear()
+        self.voicings.clear()
+        self.positions.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+SHAPE_CACHE = ShapeCache()
+if environ.get(ShapeCache.CATALOG_VARIABLE):
+    SHAPE_CACHE.load_catalog(environ[ShapeCache.CATALOG_VARIABLE])
@@ -0,0 +1,105 @@
+import json
+import mmap
+import struct
+import sys
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+from PyFreatboard.shape import Shape
+from PyFreatboard.shape_cache import ShapeCache
+
+
+class ShapeCatalog:
+    """Prebuilt shapes of every root and shape type stored in a binary file.
+
+    The file starts with a header (MAGIC, offset and length of the index), followed by
+    the shape lists and a JSON index mapping "root|type|kind|bass_string" to the offset,
+    size and number of shapes of each list. Kinds are 'scale' (BuildShape.all_shapes,
+    without bass string) and 'drop2'/'drop3' (BuildShape.build_drop on the E, A and D
+    strings), whose index entries also hold the Shape.index of every voicing (see
+    ShapeCache.get_drops). Every shape is stored as its Shape.pack bytes preceded by
+    their length.
+    The loader memory maps the file, so processes share one copy, and only builds the
+    Shape objects of the requested lists.
+    """
+    MAGIC = b'PYFBCAT2'
+    HEADER = struct.Struct('<8sQQ')
+    DROPS = (2, 3)
+    BASS_STRINGS = ('E', 'A', 'D')
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_size = ShapeCatalog.HEADER.unpack_from(self.data)
+        if magic != ShapeCatalog.MAGIC:
+            raise ValueError("{} is not a shape catalog".format(file_name))
+        self.index = json.loads(self.data[index_offset:index_offset + index_size].decode('utf-8'))
+
+    def get_shapes(self, root, shape_type, kind='scale', bass_string=None):
+        """New Shape objects of an entry, raises KeyError if it is not in the catalog"""
+        entry = self.index[ShapeCatalog.__key__(root, shape_type, kind, bass_string)]
+        offset, size = entry[:2]
+        shapes = []
+        end = offset + size
+        while offset < end:
+            length = self.data[offset]
+            shapes.append(Shape.unpack(self.data[offset + 1:offset + 1 + length]))
+            offset += 1 + length
+        if len(entry) > 3:
+            for shape, position in zip(shapes, entry[3]):
+                shape.index = position
+        return shapes
+
+    def get_drops(self, root, shape_type, drop=2, bass_string='D'):
+        return self.get_shapes(root, shape_type, 'drop{}'.format(drop), bass_string)
+
+    def __contains__(self, key):
+        return ShapeCatalog.__key__(*key) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self.data.close()
+
+    @staticmethod
+    def __key__(root, shape_type, kind='scale', bass_string=None):
+        return "{}|{}|{}|{}".format(root, shape_type, kind, bass_string or '')
+
+    @staticmethod
+    def build(file_name, shape_types=None, roots=None):
+        """Generate the catalog of shape_types (all BuildShape.SHAPES by default) for all roots into file_name"""
+        shape_types = list(BuildShape.SHAPES) if shape_types is None else shape_types
+        roots = list(Finger.NOTES) if roots is None else roots
+        # not SHAPE_CACHE, which may be reading a previous catalog from file_name
+        cache = ShapeCache(max_size=1)
+        index = {}
+        with open(file_name, 'wb') as f:
+            f.write(ShapeCatalog.HEADER.pack(ShapeCatalog.MAGIC, 0, 0))
+            for shape_type in shape_types:
+                for root in roots:
+                    entries = [(ShapeCatalog.__key__(root, shape_type), cache.get_shapes(root, shape_type))]
+                    for drop in ShapeCatalog.DROPS:
+                        if drop >= len(BuildShape.SHAPES[shape_type]):
+                            continue
+                        for bass_string in ShapeCatalog.BASS_STRINGS:
+                            key = ShapeCatalog.__key__(root, shape_type, 'drop{}'.format(drop), bass_string)
+                            entries.append((key, cache.get_drops(root, shape_type, drop, bass_string)))
+                    for key, shapes in entries:
+                        data = b''.join(bytes([len(p)]) + p for p in (s.pack() for s in shapes))
+                        index[key] = (f.tell(), len(data), len(shapes))
+                        if '|drop' in key:
+                            index[key] += ([s.index for s in shapes],)
+                        f.write(data)
+            index_offset = f.tell()
+            index_data = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            f.write(index_data)
+            f.seek(0)
+            f.write(ShapeCatalog.HEADER.pack(ShapeCatalog.MAGIC, index_offset, len(index_data)))
+        return len(index)
+
+
+if __name__ == "__main__":
+    # python -m PyFreatboard.shape_catalog catalog.bin
+    file_name = sys.argv[1] if len(sys.argv) > 1 else 'shape_catalog.bin'
+    print("{} entries written to {}".format(ShapeCatalog.build(file_name), file_name))
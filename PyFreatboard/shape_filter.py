@@ -0,0 +1,51 @@
+import heapq
+
+
+class ShapeFilter:
+    """Incremental version of the BuildShape.filter_shapes rules.
+
+    Shapes are added with a unique sort key, lowest freat first, and processed in key order.
+    Processing a shape only looks at shapes with a greater key that share its first finger
+    or that are a suffix (or have it as a suffix), so a shape can be processed as soon as
+    all the shapes able to compete with it have been added.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.by_first = {}
+        self.by_shape = {}
+        self.by_suffix = {}
+
+    def add(self, shape, sort_key):
+        key = shape.get_key()
+        entry = (sort_key, shape, key, shape.get_extensions())
+        heapq.heappush(self.pending, entry)
+        self.by_first.setdefault(key[0], []).append(entry)
+        self.by_shape.setdefault(key, []).append(entry)
+        for length in range(1, len(key)):
+            self.by_suffix.setdefault(key[-length:], []).append(entry)
+
+    def process(self, max_freat=None):
+        """Process, in key order, the pending shapes with lowest freat up to max_freat and yield them"""
+        while self.pending and (max_freat is None or self.pending[0][0][0] <= max_freat):
+            sort_key, s, key, extensions = heapq.heappop(self.pending)
+            if extensions >= 4:
+                s.valid = False
+            if s.valid:
+                # Remove same position with less notes in 6th string
+                for length in range(1, len(key)):
+                    for sort_key2, s2, _, _ in self.by_shape.get(key[-length:], []):
+                        if sort_key2 > sort_key:
+                            s2.valid = False
+                for sort_key2, s2, _, _ in self.by_suffix.get(key, []):
+                    if sort_key2 > sort_key and s2.valid:
+                        s.valid = False
+
+                # Remove same position with more extensions
+                for sort_key2, s2, _, extensions2 in self.by_first[key[0]]:
+                    if sort_key2 > sort_key and s2.valid:
+                        if extensions2 >= extensions:
+                            s2.valid = False
+                        else:
+                            s.valid = False
+            yield s
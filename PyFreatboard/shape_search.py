@@ -0,0 +1,72 @@
+from PyFreatboard.finger import Finger
+from PyFreatboard.shape import Shape
+
+
+class SearchStats:
+    """Counters of a shape search"""
+
+    def __init__(self):
+        self.nodes_visited = 0
+        self.nodes_pruned = 0
+        self.shapes_emitted = 0
+
+    def __str__(self):
+        return "visited: {}, pruned: {}, emitted: {}".format(self.nodes_visited, self.nodes_pruned, self.shapes_emitted)
+
+
+class ShapeSearch:
+    """Depth first search of shapes on the freatboard using an explicit stack.
+
+    Candidates are the fingers returned by FingerIndex.next_fingers. A candidate is only
+    expanded if the shape keeps a span under 5 freats, stays above the nut and does not
+    move back to a lower string. Shapes are emitted in the same order than the former
+    recursive BuildShape.fill_shape: when a node has no candidates, and once per rejected
+    candidate when the last finger is on the 'e' string. With max_span, candidates making
+    the span larger than max_span are not expanded either, but they do not cause emissions.
+    """
+
+    def __init__(self, fingers, harmony, stats=None, max_span=None):
+        self.fingers = fingers
+        self.harmony = harmony
+        self.max_span = max_span
+        self.stats = SearchStats() if stats is None else stats
+
+    def search(self, path, pointer, min_freat, max_freat, shapes=None):
+        """Extend the fingers in path, appending the emitted shapes to shapes"""
+        if shapes is None:
+            shapes = []
+        path = list(path)
+        stack = [self.__expand__(path, pointer, min_freat, max_freat, shapes)]
+        while stack:
+            candidates, pointer, min_freat, max_freat = stack[-1]
+            if not candidates:
+                stack.pop()
+                path.pop()
+                continue
+            f = candidates.pop()
+            new_min = min(min_freat, f.freat)
+            new_max = max(max_freat, f.freat)
+            if new_max - new_min < 5 and new_min > 0 and Finger.STRING_CODES[f.string] <= Finger.STRING_CODES[path[-1].string]:
+                if self.max_span is not None and new_max - new_min > self.max_span:
+                    self.stats.nodes_pruned += 1
+                    continue
+                path.append(f)
+                stack.append(self.__expand__(path, (pointer + 1) % len(self.harmony), new_min, new_max, shapes))
+            else:
+                self.stats.nodes_pruned += 1
+                if path[-1].string == 'e':
+                    self.__emit__(path, shapes)
+        return shapes
+
+    def __expand__(self, path, pointer, min_freat, max_freat, shapes):
+        self.stats.nodes_visited += 1
+        candidates = self.fingers.next_fingers(self.harmony[pointer], path[-1])
+        if not candidates:
+            self.__emit__(path, shapes)
+        # reversed so that pop() returns candidates in order
+        candidates.reverse()
+        return candidates, pointer, min_freat, max_freat
+
+    def __emit__(self, path, shapes):
+        self.stats.shapes_emitted += 1
+        shapes.append(Shape(list(path)))
@@ -1,18 +1,142 @@
 from PyFreatboard.song_xml import parse_song_xml
-from PyFreatboard.build_shape import BuildShape
-from PyFreatboard.draw_freatboard import DrawFreatboard
+from PyFreatboard.shape_cache import SHAPE_CACHE
+from PyFreatboard.draw_freatboard import DrawFreatboard, DrawBatch
+from PyFreatboard.voice_leading import VoiceLeading
+from PyFreatboard.melody import MelodyMapper
+from PyFreatboard.pitch_classes import PITCH_CLASSES
+from collections.abc import Mapping
+from os import stat
 from os.path import join
 
+
+class LazyShapes(Mapping):
+    """Read only dictionary computing the value of a key on first access as compute(*arguments[key])"""
+
+    def __init__(self, arguments, compute):
+        self.arguments = arguments
+        self.compute = compute
+        self.computed = {}
+
+    def __getitem__(self, key):
+        if key not in self.computed:
+            self.computed[key] = self.compute(*self.arguments[key])
+        return self.computed[key]
+
+    def __contains__(self, key):
+        return key in self.arguments
+
+    def __iter__(self):
+        return iter(self.arguments)
+
+    def __len__(self):
+        return len(self.arguments)
+
+    def __repr__(self):
+        return "LazyShapes({} keys, {} computed)".format(len(self.arguments), len(self.computed))
+
+    def update(self, arguments):
+        """Replace the keys, keeping the computed values of the keys with the same arguments"""
+        self.computed = {k: v for k, v in self.computed.items() if k in arguments and arguments[k] == self.arguments[k]}
+        self.arguments = arguments
+
+
+class SongChanges:
+    """Keys (root + type) added and removed between two versions of the sections of a song.
+
+    The diagrams of the added keys have to be drawn and the ones of the removed keys are
+    stale. sequence_changed tells if the chord sequence changed (and with it the voice
+    leading), even when no key was added or removed.
+    """
+
+    def __init__(self, old_sections, new_sections):
+        old_scales, new_scales = Song.get_scale_keys(old_sections), Song.get_scale_keys(new_sections)
+        old_chords, new_chords = Song.get_chord_keys(old_sections), Song.get_chord_keys(new_sections)
+        self.added_scales = [k for k in new_scales if k not in old_scales]
+        self.removed_scales = [k for k in old_scales if k not in new_scales]
+        self.added_chords = [k for k in new_chords if k not in old_chords]
+        self.removed_chords = [k for k in old_chords if k not in new_chords]
+        self.sequence_changed = SongChanges.__sequence__(old_sections) != SongChanges.__sequence__(new_sections)
+
+    def get_shapes(self, shapes):
+        """Shapes of the added keys, to pass to Song.draw_shapes"""
+        return {k: shapes[k] for k in self.added_scales + self.added_chords if k in shapes}
+
+    def __bool__(self):
+        return bool(self.added_scales or self.removed_scales or self.added_chords or self.removed_chords or self.sequence_changed)
+
+    def __str__(self):
+        return "scales +{} -{}, chords +{} -{}{}".format(self.added_scales, self.removed_scales, self.added_chords, self.removed_chords,
+                                                          ", sequence changed" if self.sequence_changed else "")
+
+    @staticmethod
+    def __sequence__(sections):
+        return [(s.root + s.type, [c.root + c.type for c in s.chords]) for s in sections]
+
+
 class Song:
     """Song class"""
 
-    def __init__(self, xml_file_path):
-        """Parse XML song file into Song Object"""
-        self.title, self.author, self.sections = parse_song_xml(xml_file_path)
-        self.scale_shapes = Song.__get_scales__(self.sections)
-        self.arpeggio_shapes = Song.__get_arpeggios__(self.sections)
-        self.drop2_shapes = Song.__get_drops2__(self.sections)
-        
+    def __init__(self, xml_file_path, parsed=None, shared=None):
+        """Parse XML song file into Song Object.
+
+        parsed, the (title, author, sections) of parse_song_xml, skips parsing. shared is an
+        object whose scale_shapes, arpeggio_shapes, voicing_shapes and drop2_shapes contain
+        the keys of the song (like a SongBook); the song then keeps views of its keys
+        instead of generating shapes.
+        """
+        self.file_path = xml_file_path
+        self.file_stat = Song.__stat__(xml_file_path)
+        self.title, self.author, self.sections = parse_song_xml(xml_file_path) if parsed is None else parsed
+        self.shared = shared
+        if shared is None:
+            self.scale_shapes = Song.__get_scales__(self.sections)
+            self.arpeggio_shapes = Song.__get_arpeggios__(self.sections)
+            self.voicing_shapes = Song.__get_voicings__(self.sections)
+            self.drops = {}
+            self.drop2_shapes = self.get_drops(drop=2, bass_string='D')
+        else:
+            scale_keys = Song.get_scale_keys(self.sections)
+            chord_keys = Song.get_chord_keys(self.sections)
+            self.scale_shapes = LazyShapes(scale_keys, Song.__view__(shared.scale_shapes))
+            self.arpeggio_shapes = LazyShapes(chord_keys, Song.__view__(shared.arpeggio_shapes))
+            self.voicing_shapes = LazyShapes(chord_keys, Song.__view__(shared.voicing_shapes))
+            self.drop2_shapes = LazyShapes(chord_keys, Song.__view__(shared.drop2_shapes))
+            self.drops = {(2, 'D'): self.drop2_shapes}
+
+    def reload(self, parsed=None):
+        """Parse the file again and update the shapes incrementally, returns the SongChanges.
+
+        Shapes of the keys still in the song are kept, the ones of new keys are computed on
+        first access and the ones of removed keys are dropped. The file is not parsed again
+        if its modification time and size did not change. parsed skips parsing as in __init__.
+        With shared shapes, new keys are also added to the shared ones.
+        """
+        if parsed is None:
+            file_stat = Song.__stat__(self.file_path)
+            if file_stat is not None and file_stat == self.file_stat:
+                return SongChanges(self.sections, self.sections)
+            parsed = parse_song_xml(self.file_path)
+            self.file_stat = file_stat
+        changes = SongChanges(self.sections, parsed[2])
+        self.title, self.author, self.sections = parsed
+        scale_keys = Song.get_scale_keys(self.sections)
+        chord_keys = Song.get_chord_keys(self.sections)
+        if self.shared is None:
+            self.scale_shapes.update(scale_keys)
+            self.arpeggio_shapes.update(chord_keys)
+            self.voicing_shapes.update(chord_keys)
+            for shapes in self.drops.values():
+                shapes.update(chord_keys)
+        else:
+            for shapes, keys in ((self.shared.scale_shapes, scale_keys), (self.shared.arpeggio_shapes, chord_keys),
+                                 (self.shared.voicing_shapes, chord_keys), (self.shared.drop2_shapes, chord_keys)):
+                if isinstance(shapes, LazyShapes):
+                    shapes.update(dict(shapes.arguments, **{k: v for k, v in keys.items() if k not in shapes.arguments}))
+            self.scale_shapes.update(scale_keys)
+            for shapes in [self.arpeggio_shapes, self.voicing_shapes] + list(self.drops.values()):
+                shapes.update(chord_keys)
+        return changes
+
     def get_scales(self):
         return self.scale_shapes
     
@@ -22,6 +146,45 @@ class Song:
     def get_drops2(self):
         return self.drop2_shapes
 
+    def get_drops(self, drop=2, bass_string='D'):
+        """Drop voicings of every chord for a drop (2 or 3) and bass string (E, A or D).
+
+        Voicings are numbered (Shape.index) as in the former build_drop output, with the
+        invalid voicings, so that draw_shapes keeps the same file names. They are read from
+        SHAPE_CACHE and kept for later calls with the same drop and bass string.
+        """
+        if (drop, bass_string) not in self.drops:
+            self.drops[(drop, bass_string)] = LazyShapes(dict(self.voicing_shapes.arguments),
+                                                         lambda root, shape_type: SHAPE_CACHE.get_drops(root, shape_type, drop, bass_string))
+        return self.drops[(drop, bass_string)]
+
+    def get_voicings(self):
+        """Voicings of every chord indexed by (drop, bass_string, inversion), see BuildShape.build_drops"""
+        return self.voicing_shapes
+
+    def get_chord_sequence(self):
+        """Chord keys (root + type) of the song in order"""
+        return [chord.root + chord.type for section in self.sections for chord in section.chords]
+
+    def get_voice_leading(self, drop=2, bass_string='D', movement=1.0, common_tones=1.0):
+        """(total cost, shapes) with one drop voicing per chord of the song, see VoiceLeading"""
+        return VoiceLeading(self.get_drops(drop, bass_string), movement, common_tones).solve(self.get_chord_sequence())
+
+    def get_chord_scales(self):
+        """(chord, fits, scales) for every chord: fits if the scale of its section contains it, scales the keys of all the scales containing it"""
+        chord_scales = []
+        for section in self.sections:
+            section_mask = PITCH_CLASSES.masks.get((section.root, section.type))
+            for chord in section.chords:
+                mask = PITCH_CLASSES.masks.get((chord.root, chord.type))
+                if mask is None:
+                    chord_scales.append((chord, False, []))
+                    continue
+                fits = section_mask is not None and section_mask & mask == mask
+                scales = [root + scale_type for root, scale_type in PITCH_CLASSES.containing(mask, PITCH_CLASSES.scale_types)]
+                chord_scales.append((chord, fits, scales))
+        return chord_scales
+
     def get_melody(self, melody_id):
         melody = []
         for s in self.sections:
@@ -31,52 +194,128 @@ class Song:
                         melody += c.melody[m]
         return melody
     
+    def get_melody_positions(self, melody_id, scales=True):
+        """Yield (chord, positions) with the notes of melody_id placed on the freatboard, see MelodyMapper"""
+        return MelodyMapper(self, scales=scales).iter_melody(melody_id)
+
     def __str__(self):
         return "{} by {}".format(self.title, self.author) + "\n- " + "\n- ".join(str(s) for s in self.sections)
 
     
+    @staticmethod
+    def get_scale_keys(sections):
+        """Dictionary root + type: (root, type) of the section scales, in order of appearance"""
+        keys = {}
+        for section in sections:
+            keys.setdefault(section.root + section.type, (section.root, section.type))
+        return keys
+
+    @staticmethod
+    def get_chord_keys(sections):
+        """Dictionary root + type: (root, type) of the chords, in order of appearance"""
+        keys = {}
+        for section in sections:
+            for chord in section.chords:
+                keys.setdefault(chord.root + chord.type, (chord.root, chord.type))
+        return keys
+
+    @staticmethod
+    def __stat__(file_path):
+        """(modification time, size) of the file, None if it can not be read"""
+        try:
+            file_stat = stat(file_path)
+        except OSError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    @staticmethod
+    def __view__(shapes):
+        """Compute function of a LazyShapes reading the shapes of (root, type) from shapes"""
+        return lambda root, shape_type: shapes[root + shape_type]
+
     @staticmethod
     def __get_scales__(sections):
         """Get all scale shapes from song"""
-        shapes = {}
-        for section in sections:
-            key = section.root + section.type
-            if key not in shapes:
-                shapes[key] = BuildShape(section.root, section.type).all_shapes
-        return shapes
+        return LazyShapes(Song.get_scale_keys(sections), SHAPE_CACHE.get_shapes)
 
     @staticmethod
     def __get_arpeggios__(sections):
         """Get all shapes from song"""
-        shapes = {}
-        for section in sections:
-            for chord in section.chords:
-                key = chord.root + chord.type
-                if key not in shapes:
-                    shapes[key] = BuildShape(chord.root, chord.type).all_shapes
-        return shapes
-    
+        return LazyShapes(Song.get_chord_keys(sections), SHAPE_CACHE.get_shapes)
+
     @staticmethod
-    def __get_drops2__(sections):
-        shapes = {}
-        for section in sections:
-            for chord in section.chords:
-                key = chord.root + chord.type
-                if key not in shapes:
-                    sh = BuildShape(chord.root, chord.type)
-                    shapes[key] = sh.build_drop(drop=2, bass_string='D')
-        return shapes
+    def __get_voicings__(sections):
+        """Get drop 2 and drop 3 voicings on every bass string for all chords in one pass"""
+        return LazyShapes(Song.get_chord_keys(sections), SHAPE_CACHE.get_voicings)
+
+    @staticmethod
+    def draw_shapes(shapes, path='.', init_freat=None, vertical=False, workers=1, chunk_size=16, progress=None, cache=None):
+        """Save every valid shape as __{name}_{index}.png.
+
+        With workers > 1 the diagrams are split in chunks of chunk_size saved by a pool of
+        processes using the Agg backend. progress(done, total) is called after every chunk.
+        Failing files do not stop the export, their (file_name, error) pairs are returned.
+        With a RenderCache, cached diagrams are copied and only the missing ones are drawn.
+        On platforms that start processes with spawn (macOS, Windows) the workers import the
+        calling script again, so with workers > 1 call it under if __name__ == "__main__":.
+        """
+        jobs = [(shape, join(path, '__{}_{}.png'.format(shape_name, e)), shape_name) for shape_name, e, shape in Song.__select_shapes__(shapes, init_freat)]
+        if cache is not None:
+            keys = {file_name: cache.key(shape, shape_name, vertical) for shape, file_name, shape_name in jobs}
+            jobs = [job for job in jobs if not cache.fetch(keys[job[1]], job[1])]
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        errors = []
+        done = 0
+        if workers > 1:
+            # imported here, multiprocessing takes longer to import than the rest of the package
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {}
+                for chunk in chunks:
+                    packed = [(shape.pack(), file_name, shape_name) for shape, file_name, shape_name in chunk]
+                    futures[pool.submit(DrawBatch.save_packed, packed, vertical)] = chunk
+                for future in as_completed(futures):
+                    chunk = futures[future]
+                    try:
+                        errors += future.result()
+                    except Exception as e:
+                        errors += [(file_name, "{}: {}".format(type(e).__name__, e)) for _, file_name, _ in chunk]
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, len(jobs))
+        else:
+            with DrawFreatboard().batch(vertical=vertical) as batch:
+                for chunk in chunks:
+                    errors += batch.save_all(chunk)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, len(jobs))
+        if cache is not None:
+            failed = set(file_name for file_name, _ in errors)
+            for _, file_name, _ in jobs:
+                if file_name not in failed:
+                    cache.store(keys[file_name], file_name)
+        return sorted(errors)
+
+    @staticmethod
+    def draw_sheet(shapes, file_name, init_freat=None, vertical=False, columns=4, rows=None, **kwargs):
+        """Save the valid shapes selected as in draw_shapes on a single sheet, or a multipage PDF when rows is given.
+
+        Pass a dictionary with one key (a chord), the keys of a section or all of them.
+        Other keyword arguments are the ones of DrawFreatboard.draw_sheet. Returns the number of pages.
+        """
+        selected = [(shape_name, shape) for shape_name, _, shape in Song.__select_shapes__(shapes, init_freat)]
+        return DrawFreatboard().draw_sheet(selected, file_name, columns=columns, rows=rows, vertical=vertical, **kwargs)
 
     @staticmethod
-    def draw_shapes(shapes, path='.', init_freat=None, vertical=False):
-        draw = DrawFreatboard()
+    def __select_shapes__(shapes, init_freat=None):
+        """(shape_name, index, shape) of the valid shapes starting at init_freat (or one freat below).
+        index is Shape.index, or the position of the shape in its list when it is None."""
+        selected = []
         for shape_name, all_shapes in zip(shapes.keys(), shapes.values()):
             for e, shape in enumerate(all_shapes):
                 if shape.valid:
                     min_freat = shape.get_max_min_freat()[1]
                     if init_freat is None or min_freat == init_freat or (min_freat + 1) == init_freat:
-                        if vertical:
-                            f = draw.draw_shape_vertical(shape, shape_name=shape_name, return_fig=True)
-                        else:
-                            f = draw.draw_shape(shape, shape_name=shape_name, return_fig=True)
-                        f.savefig(join(path, '__{}_{}.png'.format(shape_name, e)), bbox_inches='tight')
+                        selected.append((shape_name, e if shape.index is None else shape.index, shape))
+        return selected
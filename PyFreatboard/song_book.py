@@ -0,0 +1,66 @@
+from glob import glob
+from os.path import basename, join, splitext
+from PyFreatboard.song import Song
+from PyFreatboard.song_xml import parse_song_xml, SongParseError
+
+
+class SongBook:
+    """Songs of a directory sharing their shapes.
+
+    Files are parsed (in parallel with workers > 1), then the scale and chord keys of
+    all the songs are merged so that every scale, arpeggio and voicing matrix is
+    generated once for the whole book, on first use. Songs are views over these shared shapes.
+    Files that can not be parsed are left out and their errors kept in errors.
+    Parsing in worker processes imports the calling script again where processes are
+    spawned (macOS, Windows), so create the book under if __name__ == "__main__": there.
+    """
+
+    def __init__(self, directory, pattern='*.xml', workers=1):
+        self.directory = directory
+        files = sorted(glob(join(directory, pattern)))
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(SongBook.__parse__, files))
+        else:
+            results = [SongBook.__parse__(f) for f in files]
+
+        self.errors = {}
+        parsed = {}
+        for file_name, (song, error) in zip(files, results):
+            if error is None:
+                parsed[file_name] = song
+            else:
+                self.errors[file_name] = error
+
+        sections = [s for _, _, song_sections in parsed.values() for s in song_sections]
+        self.scale_shapes = Song.__get_scales__(sections)
+        self.arpeggio_shapes = Song.__get_arpeggios__(sections)
+        self.voicing_shapes = Song.__get_voicings__(sections)
+        self.drops = {}
+        self.drop2_shapes = self.get_drops(drop=2, bass_string='D')
+        self.songs = {splitext(basename(f))[0]: Song(f, song, self) for f, song in parsed.items()}
+
+    def get_song(self, name):
+        """Song of the file name, without directory and extension"""
+        return self.songs[name]
+
+    def get_drops(self, drop=2, bass_string='D'):
+        """Drop voicings of every chord in the book, see Song.get_drops"""
+        return Song.get_drops(self, drop, bass_string)
+
+    def __iter__(self):
+        return iter(self.songs.values())
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __str__(self):
+        return "{} songs, {} scales, {} chords".format(len(self.songs), len(self.scale_shapes), len(self.arpeggio_shapes))
+
+    @staticmethod
+    def __parse__(file_name):
+        try:
+            return parse_song_xml(file_name), None
+        except (SongParseError, OSError) as e:
+            return None, e
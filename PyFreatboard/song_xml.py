@@ -1,86 +1,144 @@
-from xml.dom.minidom import parse
+from xml.parsers import expat
 from PyFreatboard.section import Section, Chord, Note
+from PyFreatboard.instrumentation import instrumented
 
 
+class SongParseError(Exception):
+    """Invalid song XML file, with the line of the element where the problem was found"""
+
+    def __init__(self, message, line=None, path=None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+        self.path = path
+
+    def __str__(self):
+        location = "{}:{}".format(self.path, self.line) if self.line is not None else str(self.path)
+        return "{}: {}".format(location, self.message)
+
+
+class SongXMLParser:
+    """Streaming parser of song XML files.
+
+    The file is read in chunks of CHUNK_SIZE bytes and Section, Chord and Note objects
+    are built while it is read, without keeping a document tree. title and author are
+    set once their tags have been read.
+    """
+    CHUNK_SIZE = 64*1024
+    LEAVES = {'song': ('title', 'author'),
+              'scale': ('root', 'type'),
+              'chord': ('root', 'type', 'duration'),
+              'note': ('pitch', 'octave', 'duration')}
+
+    def __init__(self, xml_file_path):
+        self.path = xml_file_path
+        self.title = ""
+        self.author = ""
+
+    def iter_sections(self):
+        """Yield the sections of the song as soon as they are parsed"""
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = self.__start__
+        parser.EndElementHandler = self.__end__
+        parser.CharacterDataHandler = self.__text__
+        self.parser = parser
+        self.stack = [] # (tag, line, fields) of the open elements
+        self.sections = []
+        try:
+            with open(self.path, 'rb') as f:
+                while True:
+                    data = f.read(SongXMLParser.CHUNK_SIZE)
+                    try:
+                        parser.Parse(data, not data)
+                    except expat.ExpatError as e:
+                        raise SongParseError(expat.errors.messages[e.code], e.lineno, self.path) from None
+                    yield from self.sections
+                    self.sections = []
+                    if not data:
+                        break
+        finally:
+            # the handlers reference self, drop the cycle so memory is freed without the gc
+            self.parser = None
+            self.stack = []
+
+    def __start__(self, tag, attributes):
+        fields = {}
+        if tag == 'section':
+            fields['chords'] = []
+        elif tag == 'chord':
+            fields['melodies'] = []
+        elif tag == 'melody':
+            fields['id'] = attributes.get('id', '')
+            fields['notes'] = []
+        self.stack.append((tag, self.parser.CurrentLineNumber, fields))
+        self.text = []
+
+    def __text__(self, data):
+        self.text.append(data)
+
+    def __end__(self, tag):
+        _, line, fields = self.stack.pop()
+        parent = self.stack[-1] if self.stack else None
+        if parent is not None and tag in SongXMLParser.LEAVES.get(parent[0], ()):
+            # first tag wins, as getElementsByTagName(tag)[0] did
+            parent[2].setdefault(tag, ''.join(self.text).strip())
+        elif tag == 'scale':
+            section = self.__find__('section')
+            if section is not None and 'scale' not in section:
+                section['scale'] = self.__required__(fields, ('root', 'type'), tag, line)
+        elif tag == 'note':
+            pitch, octave, duration = self.__required__(fields, ('pitch', 'octave', 'duration'), tag, line)
+            note = Note(pitch, self.__to_int__(duration, line), self.__to_int__(octave, line))
+            melody = self.__find__('melody')
+            if melody is not None:
+                melody['notes'].append(note)
+        elif tag == 'melody':
+            chord = self.__find__('chord')
+            if chord is not None:
+                chord['melodies'].append((fields['id'], fields['notes']))
+        elif tag == 'chord':
+            root, type, duration = self.__required__(fields, ('root', 'type', 'duration'), tag, line)
+            c = Chord(root, type, self.__to_int__(duration, line))
+            for melody_id, notes in fields['melodies']:
+                c.add_melody(melody_id, notes)
+            section = self.__find__('section')
+            if section is not None:
+                section['chords'].append(c)
+        elif tag == 'section':
+            if 'scale' not in fields:
+                raise SongParseError("No scale found in section", line, self.path)
+            s = Section(*fields['scale'])
+            for c in fields['chords']:
+                s.add_chord(c)
+            self.sections.append(s)
+        elif tag == 'song':
+            self.title = fields.get('title', "")
+            self.author = fields.get('author', "")
+        self.text = []
+
+    def __find__(self, tag):
+        """Fields of the innermost open element tag"""
+        for t, _, fields in reversed(self.stack):
+            if t == tag:
+                return fields
+        return None
+
+    def __required__(self, fields, names, tag, line):
+        missing = [n for n in names if not fields.get(n)]
+        if missing:
+            raise SongParseError("No {} found in {}".format(", ".join(missing), tag), line, self.path)
+        return tuple(fields[n] for n in names)
+
+    def __to_int__(self, value, line):
+        try:
+            return int(value)
+        except ValueError:
+            raise SongParseError("Invalid number {!r}".format(value), line, self.path) from None
+
+
+@instrumented('parse_song_xml', key=lambda xml_file_path: xml_file_path, count=lambda song: len(song[2]))
 def parse_song_xml(xml_file_path):
-    """Parse XML file into Song Object"""
-    doc = parse(xml_file_path)
-    # get song title
-    title = ""
-    try:
-        title = doc.getElementsByTagName("title")[0].firstChild.data
-    except:
-        print("No title found")
-
-    # get song author
-    author = ""
-    try:
-        author = doc.getElementsByTagName("author")[0].firstChild.data
-    except:
-        print("No author found")
-
-    # get all section tags
-    secs = []
-    sections = doc.getElementsByTagName("section")
-    for section in sections:
-        s = __parse_section__(section)
-        secs.append(s)
-    
-    return title, author, secs
-    
-def __parse_section__(section):
-    """Parse section tag into Section tag"""
-
-    # get section scale
-    try:
-        scale = section.getElementsByTagName("scale")
-        root, type = __get_root_and_type__(scale[0])
-        s = Section(root, type)
-    except:
-        print("No scale found")
-
-    # get section chords
-    chords = section.getElementsByTagName("chord")
-    for chord in chords:
-        c = __get_chords__(chord)
-        s.add_chord(c)
-    return s
-
-def __get_root_and_type__(element):
-    """Get root and type from scale or chord tag"""
-    try:
-        root = element.getElementsByTagName("root")[0].firstChild.data
-        type = element.getElementsByTagName("type")[0].firstChild.data
-        return root, type
-    except:
-        print("No root or type found")
-
-def __get_chords__(chord):
-    c = None
-    try:
-        root, type = __get_root_and_type__(chord)
-        duration = chord.getElementsByTagName("duration")[0].firstChild.data
-        c = Chord(root, type, int(duration))
-    except:
-        print("Invalid chord tag")
-    
-    # get section chords
-    melodies = chord.getElementsByTagName("melody")
-    for melody in melodies:
-        melody_id = melody.getAttribute("id")
-        notes = melody.getElementsByTagName("note")
-        melody_notes = []
-        for note in notes:
-            n = __get_note__(note)
-            melody_notes.append(n)
-        c.add_melody(melody_id, melody_notes)
-    return c
-
-def __get_note__(note):
-    try:
-        pitch = note.getElementsByTagName("pitch")[0].firstChild.data
-        octave = note.getElementsByTagName("octave")[0].firstChild.data
-        duration = note.getElementsByTagName("duration")[0].firstChild.data
-        return Note(pitch, int(octave), int(duration))
-    except:
-        print("No note pitch, octave or duration found")
+    """Parse XML file into title, author and list of sections, raising SongParseError if invalid"""
+    parser = SongXMLParser(xml_file_path)
+    sections = list(parser.iter_sections())
+    return parser.title, parser.author, sections
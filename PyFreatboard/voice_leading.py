@@ -0,0 +1,77 @@
+class VoiceLeading:
+    """Minimum cost sequence of voicings for a chord progression.
+
+    voicings maps every chord key (root + type) to its candidate shapes, like
+    Song.get_drops2(); only valid shapes are used. Moving from voicing a to voicing b
+    costs movement for every freat the hand position (lowest freat) moves, plus
+    common_tones for every note of b that is not a common tone (same pitch) of a.
+    The best path is found by dynamic programming (Viterbi) over the chords, so the
+    time is linear in the number of chords. Transition costs between two chord keys
+    are computed once and reused, as progressions repeat the same changes.
+    """
+
+    def __init__(self, voicings, movement=1.0, common_tones=1.0):
+        self.voicings = voicings
+        self.movement = movement
+        self.common_tones = common_tones
+        self.candidates = {}
+        self.transitions = {}
+
+    def solve(self, keys):
+        """(total cost, shapes) of the best path for the chord keys, None for chords without voicings"""
+        path = [None]*len(keys)
+        steps = [] # (chord index, key, back pointers) of the chords with voicings
+        costs = None
+        previous = None
+        for i, key in enumerate(keys):
+            if not self.__get_candidates__(key):
+                continue
+            if costs is None:
+                costs = [0.0]*len(self.candidates[key])
+                back = None
+            else:
+                matrix = self.__get_transitions__(previous, key)
+                new_costs = []
+                back = []
+                for j in range(len(self.candidates[key])):
+                    best = min(range(len(costs)), key=lambda k: costs[k] + matrix[k][j])
+                    new_costs.append(costs[best] + matrix[best][j])
+                    back.append(best)
+                costs = new_costs
+            steps.append((i, key, back))
+            previous = key
+        if costs is None:
+            return 0.0, path
+
+        best = min(range(len(costs)), key=costs.__getitem__)
+        total = costs[best]
+        for i, key, back in reversed(steps):
+            path[i] = self.candidates[key][best][0]
+            if back is not None:
+                best = back[best]
+        return total, path
+
+    def cost(self, a, b):
+        """Cost of moving from shape a to shape b"""
+        return self.__cost__(VoiceLeading.__features__(a), VoiceLeading.__features__(b))
+
+    def __get_candidates__(self, key):
+        if key not in self.candidates:
+            shapes = self.voicings[key] if key in self.voicings else []
+            self.candidates[key] = [(s, VoiceLeading.__features__(s)) for s in shapes if s.valid]
+        return self.candidates[key]
+
+    def __get_transitions__(self, key_a, key_b):
+        if (key_a, key_b) not in self.transitions:
+            self.transitions[(key_a, key_b)] = [[self.__cost__(a, b) for _, b in self.candidates[key_b]] for _, a in self.candidates[key_a]]
+        return self.transitions[(key_a, key_b)]
+
+    def __cost__(self, a, b):
+        position_a, pitches_a = a
+        position_b, pitches_b = b
+        return self.movement*abs(position_a - position_b) + self.common_tones*len(pitches_b - pitches_a)
+
+    @staticmethod
+    def __features__(shape):
+        """Hand position (lowest freat) and pitches of shape"""
+        return shape.get_max_min_freat()[1], frozenset(f.get_pitch() for f in shape.fingers)
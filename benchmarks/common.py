@@ -0,0 +1,14 @@
+"""Helpers shared by the benchmark scripts.
+
+Importing this module puts the repository root first on sys.path, so the scripts run from a
+checkout (python benchmarks/suite.py) without installing PyFreatboard. Import it before
+any PyFreatboard module. The helpers also used by the tests are in tests/helpers.py.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from tests.helpers import BUDGET_MS, MODULE, copy_shapes, fingered_shapes, import_time, reference_filter_shapes  # noqa: E402,F401
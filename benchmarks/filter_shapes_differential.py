@@ -0,0 +1,32 @@
+"""Differential check of BuildShape.filter_shapes against the original quadratic implementation.
+
+Every BuildShape.SHAPES entry is generated for all roots and both filters must keep exactly the
+same shapes, in the same order. Timings of both filters are reported.
+"""
+import time
+from common import reference_filter_shapes, fingered_shapes, copy_shapes
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+
+
+if __name__ == "__main__":
+    reference_time = 0
+    new_time = 0
+    differences = 0
+    for shape_type in BuildShape.SHAPES:
+        for root in Finger.NOTES:
+            shapes = fingered_shapes(root, shape_type)
+            reference = copy_shapes(shapes)
+            t0 = time.perf_counter()
+            reference = reference_filter_shapes(reference)
+            t1 = time.perf_counter()
+            new = BuildShape.filter_shapes(copy_shapes(shapes))
+            t2 = time.perf_counter()
+            reference_time += t1 - t0
+            new_time += t2 - t1
+            if [(s.valid, s.get_key()) for s in reference] != [(s.valid, s.get_key()) for s in new]:
+                differences += 1
+                print("Different survivors for {} {}".format(root, shape_type))
+    print("reference: {:.3f} s, filter_shapes: {:.3f} s".format(reference_time, new_time))
+    if differences > 0:
+        raise SystemExit("{} shape lists differ".format(differences))
@@ -0,0 +1,19 @@
+"""Check the import time of the shape generation modules with python -X importtime.
+
+Usage: python benchmarks/import_time.py [budget_ms]
+
+Fails if importing PyFreatboard.build_shape takes longer than the budget (50 ms by default)
+or if it imports matplotlib.
+"""
+import sys
+from common import BUDGET_MS, MODULE, import_time
+
+
+if __name__ == "__main__":
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    cumulative, modules = import_time(MODULE)
+    print("{}: {:.1f} ms (budget {:.1f} ms)".format(MODULE, cumulative / 1000, budget_ms))
+    if any(m.split(".")[0] == "matplotlib" for m in modules):
+        raise SystemExit("{} imports matplotlib".format(MODULE))
+    if cumulative / 1000 > budget_ms:
+        raise SystemExit("{} import time over budget".format(MODULE))
@@ -0,0 +1,52 @@
+"""Time and resident memory saving many diagrams one figure per shape and with DrawFreatboard.batch"""
+import resource
+import sys
+import tempfile
+import time
+from os.path import join
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+import common  # noqa: F401
+from PyFreatboard.draw_freatboard import DrawFreatboard
+from PyFreatboard.shape_cache import SHAPE_CACHE
+from PyFreatboard.finger import Finger
+
+
+def get_shapes(count):
+    shapes = []
+    for root in Finger.NOTES:
+        for shape_type in ('Major', '-7', '7', 'Pentatonic'):
+            shapes += [s for s in SHAPE_CACHE.get_shapes(root, shape_type) if s.valid]
+    return (shapes * (count // len(shapes) + 1))[:count]
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def figure_per_shape(draw, shapes, path):
+    for e, shape in enumerate(shapes):
+        f = draw.draw_shape(shape, shape_name='shape', return_fig=True)
+        f.savefig(join(path, '__shape_{}.png'.format(e)), bbox_inches='tight')
+        plt.close(f)
+
+
+def batch(draw, shapes, path):
+    with draw.batch() as b:
+        for e, shape in enumerate(shapes):
+            b.save(shape, join(path, '__shape_{}.png'.format(e)), shape_name='shape')
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    shapes = get_shapes(count)
+    draw = DrawFreatboard()
+    with tempfile.TemporaryDirectory() as path:
+        for name, render in (('batch', batch), ('figure per shape', figure_per_shape)):
+            rss = max_rss()
+            t0 = time.perf_counter()
+            render(draw, shapes, path)
+            elapsed = time.perf_counter() - t0
+            print("{}: {} diagrams in {:.2f} s ({:.1f} ms each), max rss +{:.1f} MB, open figures: {}".format(
+                name, count, elapsed, 1000 * elapsed / count, max_rss() - rss, len(plt.get_fignums())))
@@ -0,0 +1,27 @@
+"""Time and memory allocated generating every BuildShape.SHAPES entry for all roots"""
+import time
+import tracemalloc
+import common  # noqa: F401
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+
+
+def generate_all():
+    shapes = []
+    for shape_type in BuildShape.SHAPES:
+        for root in Finger.NOTES:
+            shapes.append(BuildShape(root, shape_type).all_shapes)
+    return shapes
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    generate_all()
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    shapes = generate_all()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("time: {:.2f} s".format(elapsed))
+    print("retained: {:.1f} MB, peak: {:.1f} MB".format(retained / 2**20, peak / 2**20))
@@ -0,0 +1,40 @@
+"""Time to open a ShapeCatalog and look shapes up, against generating them, checking both are equal"""
+import os
+import sys
+import tempfile
+import time
+import common  # noqa: F401
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+from PyFreatboard.shape_catalog import ShapeCatalog
+
+
+if __name__ == "__main__":
+    shape_types = ['Major', 'Pentatonic', '-7', '7', 'Maj7', '-7b5']
+    with tempfile.TemporaryDirectory() as path:
+        file_name = os.path.join(path, 'catalog.bin')
+        t0 = time.perf_counter()
+        entries = ShapeCatalog.build(file_name, shape_types)
+        print("build: {} entries, {} KB in {:.2f} s".format(entries, os.path.getsize(file_name) // 1024, time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        catalog = ShapeCatalog(file_name)
+        print("open: {:.2f} ms".format(1000 * (time.perf_counter() - t0)))
+
+        lookup = generate = 0
+        for shape_type in shape_types:
+            for root in Finger.NOTES:
+                t0 = time.perf_counter()
+                shapes = catalog.get_shapes(root, shape_type)
+                drops = catalog.get_drops(root, shape_type, 2, 'D')
+                t1 = time.perf_counter()
+                build = BuildShape(root, shape_type)
+                expected = build.all_shapes
+                expected_drops = build.build_drop(2, 'D')
+                generate += time.perf_counter() - t1
+                lookup += t1 - t0
+                if [s.pack() for s in shapes + drops] != [s.pack() for s in expected + expected_drops]:
+                    sys.exit("different shapes for {} {}".format(root, shape_type))
+        count = 12 * len(shape_types)
+        print("lookup: {:.0f} us per root and type, generation: {:.0f} us".format(1e6 * lookup / count, 1e6 * generate / count))
+        catalog.close()
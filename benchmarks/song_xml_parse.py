@@ -0,0 +1,75 @@
+"""Throughput of parse_song_xml against the former minidom parser, checking both give the same songs"""
+import glob
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.dom.minidom import parse
+import common  # noqa: F401
+from PyFreatboard.section import Section, Chord, Note
+from PyFreatboard.song_xml import parse_song_xml
+
+
+def __text__(element, tag):
+    return element.getElementsByTagName(tag)[0].firstChild.data
+
+
+def reference_parse_song_xml(xml_file_path):
+    """parse_song_xml as it was with xml.dom.minidom, for valid files and with Note(pitch, duration, octave)"""
+    doc = parse(xml_file_path)
+    sections = []
+    for section in doc.getElementsByTagName("section"):
+        scale = section.getElementsByTagName("scale")[0]
+        s = Section(__text__(scale, "root"), __text__(scale, "type"))
+        for chord in section.getElementsByTagName("chord"):
+            c = Chord(__text__(chord, "root"), __text__(chord, "type"), int(__text__(chord, "duration")))
+            for melody in chord.getElementsByTagName("melody"):
+                notes = [Note(__text__(n, "pitch"), int(__text__(n, "duration")), int(__text__(n, "octave"))) for n in melody.getElementsByTagName("note")]
+                c.add_melody(melody.getAttribute("id"), notes)
+            s.add_chord(c)
+        sections.append(s)
+    return __text__(doc, "title"), __text__(doc, "author"), sections
+
+
+def summary(song):
+    title, author, sections = song
+    return (title, author, [(s.root, s.type, [(c.root, c.type, c.duration, sorted((k, [(n.pitch, n.duration, n.octave) for n in v]) for k, v in c.melody.items())) for c in s.chords]) for s in sections])
+
+
+def big_song(files, copies):
+    """Song with the sections of files repeated copies times"""
+    bodies = []
+    for file_name in files:
+        text = open(file_name).read()
+        bodies.append(text[text.index('<section'):text.rindex('</song>')])
+    return '<?xml version="1.0" encoding="UTF-8"?>\n<song>\n<title>Big</title>\n<author>Many</author>\n' + ''.join(bodies) * copies + '</song>\n'
+
+
+def measure(parser, file_name):
+    t0 = time.perf_counter()
+    parser(file_name)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    parser(file_name)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    files = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'songs_xml', '*.xml')))
+    for file_name in files:
+        if summary(parse_song_xml(file_name)) != summary(reference_parse_song_xml(file_name)):
+            sys.exit("different songs for " + file_name)
+    with tempfile.TemporaryDirectory() as path:
+        file_name = os.path.join(path, 'big.xml')
+        with open(file_name, 'w') as f:
+            f.write(big_song(files, copies))
+        if summary(parse_song_xml(file_name)) != summary(reference_parse_song_xml(file_name)):
+            sys.exit("different songs for the big song")
+        size = os.path.getsize(file_name) / 2**20
+        for name, parser in (('streaming', parse_song_xml), ('minidom', reference_parse_song_xml)):
+            elapsed, peak = measure(parser, file_name)
+            print("{}: {:.1f} MB in {:.2f} s, {:.1f} MB/s, peak memory {:.1f} MB".format(name, size, elapsed, size / elapsed, peak / 2**20))
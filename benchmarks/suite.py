@@ -0,0 +1,184 @@
+"""Benchmark suite with stored baselines.
+
+Usage: python benchmarks/suite.py [--save] [--check] [--threshold 0.25] [--repeat 3] [case ...]
+
+Every case reports its best time over --repeat runs and the peak memory traced by
+tracemalloc in one more run. --save stores the results in benchmarks/baseline.json (or
+--baseline) and --check fails if the time or peak memory of any case is more than
+threshold (0.25 is 25%) over its baseline, ignoring peak memory differences under
+PEAK_SLACK bytes. Baselines depend on the machine, so they are not part of the
+repository: run --save once on a machine before using --check there.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from functools import lru_cache
+from common import copy_shapes
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+from PyFreatboard.song_xml import parse_song_xml
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SONGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'songs_xml')
+SAMPLE_TYPES = ['Major', 'Pentatonic', 'Diminished', '-7', '7', 'TriadMaj']
+PEAK_SLACK = 64*1024
+CHORD_TYPES = [t for t, notes in BuildShape.SHAPES.items() if len(notes) <= 4]
+
+
+@lru_cache(maxsize=None)
+def unfingered_shapes():
+    return [(root, shape_type, BuildShape(root, shape_type).scale_to_freatboard()) for shape_type in SAMPLE_TYPES for root in Finger.NOTES]
+
+
+@lru_cache(maxsize=None)
+def fingered_shapes():
+    return [[s.set_fingering() for s in shapes] for _, _, shapes in unfingered_shapes()]
+
+
+@lru_cache(maxsize=None)
+def drawing_shapes():
+    return [s for root in Finger.NOTES for s in BuildShape(root, '-7').build_drop(2, 'D')]
+
+
+def build_shape():
+    for shape_type in BuildShape.SHAPES:
+        for root in Finger.NOTES:
+            BuildShape(root, shape_type).all_shapes
+
+
+def build_drop():
+    for shape_type in CHORD_TYPES:
+        for root in Finger.NOTES:
+            b = BuildShape(root, shape_type)
+            for drop in (2, 3):
+                if drop < len(BuildShape.SHAPES[shape_type]):
+                    for bass_string in ('E', 'A', 'D'):
+                        b.build_drop(drop, bass_string)
+
+
+def set_fingering(shapes):
+    for _, _, all_shapes in shapes:
+        for s in all_shapes:
+            s.set_fingering()
+
+
+def filter_shapes(shapes):
+    for all_shapes in shapes:
+        BuildShape.filter_shapes(all_shapes)
+
+
+def parse_songs(files):
+    for _ in range(20):
+        for file_name in files:
+            parse_song_xml(file_name)
+
+
+def draw_png(shapes):
+    from PyFreatboard.draw_freatboard import DrawFreatboard
+    with DrawFreatboard().batch() as batch:
+        for s in shapes[:24]:
+            batch.save(s, io.BytesIO(), shape_name='shape', format='png')
+
+
+def draw_svg(shapes):
+    from PyFreatboard.draw_svg import DrawFreatboardSVG
+    draw = DrawFreatboardSVG()
+    for _ in range(20):
+        for s in shapes:
+            draw.draw_shape(s, shape_name='shape')
+            draw.draw_shape_vertical(s, shape_name='shape')
+
+
+def __matplotlib__():
+    import matplotlib
+    matplotlib.use('Agg')
+    return drawing_shapes()
+
+
+# name: (run, setup returning the run arguments, called before every run)
+CASES = {
+    'build_shape': (build_shape, lambda: ()),
+    'build_drop': (build_drop, lambda: ()),
+    'set_fingering': (set_fingering, lambda: (unfingered_shapes(),)),
+    'filter_shapes': (filter_shapes, lambda: ([copy_shapes(s) for s in fingered_shapes()],)),
+    'parse_song_xml': (parse_songs, lambda: (sorted(os.path.join(SONGS, f) for f in os.listdir(SONGS)),)),
+    'draw_png': (draw_png, lambda: (__matplotlib__(),)),
+    'draw_svg': (draw_svg, lambda: (drawing_shapes(),)),
+}
+
+
+def measure(run, setup, repeat):
+    """Best time in seconds over repeat runs and peak traced memory in bytes"""
+    best = None
+    for _ in range(repeat):
+        args = setup()
+        t0 = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    run(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyFreatboard benchmark suite")
+    parser.add_argument('cases', nargs='*', help="cases to run, all by default: " + ", ".join(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help="store the results as baseline")
+    parser.add_argument('--check', action='store_true', help="fail if a case regresses over the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed regression, 0.25 is 25%%")
+    args = parser.parse_args()
+
+    unknown = [c for c in args.cases if c not in CASES]
+    if unknown:
+        parser.error("unknown cases: " + ", ".join(unknown))
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif args.check and not args.save:
+        parser.error("no baseline in {}, run with --save first".format(args.baseline))
+
+    results = {}
+    regressions = []
+    print("{:<16}{:>12}{:>12}{:>14}{:>12}".format('case', 'time ms', 'vs base', 'peak MB', 'vs base'))
+    for name in args.cases or CASES:
+        run, setup = CASES[name]
+        elapsed, peak = measure(run, setup, args.repeat)
+        results[name] = {'time': elapsed, 'peak': peak}
+        ratios = []
+        for metric, value in (('time', elapsed), ('peak', peak)):
+            base = baseline.get(name, {}).get(metric)
+            if base:
+                ratios.append('{:+.0%}'.format(value / base - 1))
+                slack = PEAK_SLACK if metric == 'peak' else 0
+                if value > base * (1 + args.threshold) and value - base > slack:
+                    regressions.append("{} {}: {:.4g} over baseline {:.4g}".format(name, metric, value, base))
+            else:
+                ratios.append('-')
+        print("{:<16}{:>12.1f}{:>12}{:>14.2f}{:>12}".format(name, 1000 * elapsed, ratios[0], peak / 2**20, ratios[1]))
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print("baseline saved to " + args.baseline)
+    if args.check and regressions:
+        print("\n".join(regressions))
+        sys.exit("{} regressions over {:.0%}".format(len(regressions), args.threshold))
+
+
+if __name__ == "__main__":
+    main()
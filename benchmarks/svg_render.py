@@ -0,0 +1,26 @@
+"""Diagrams per second drawn by DrawFreatboardSVG, checking matplotlib is not imported"""
+import sys
+import time
+import common  # noqa: F401
+from PyFreatboard.draw_svg import DrawFreatboardSVG
+from PyFreatboard.shape_cache import SHAPE_CACHE
+from PyFreatboard.finger import Finger
+
+
+if __name__ == "__main__":
+    shapes = []
+    for root in Finger.NOTES:
+        for shape_type in ('Major', '-7', '7', 'Pentatonic'):
+            shapes += [s for s in SHAPE_CACHE.get_shapes(root, shape_type) if s.valid]
+        shapes += SHAPE_CACHE.get_drops(root, '-7')
+    draw = DrawFreatboardSVG()
+    t0 = time.perf_counter()
+    for text in range(4):
+        for shape in shapes:
+            draw.draw_shape(shape, text=text, shape_name='shape')
+            draw.draw_shape_vertical(shape, text=text, shape_name='shape')
+    elapsed = time.perf_counter() - t0
+    count = 8 * len(shapes)
+    print("{} diagrams in {:.2f} s, {:.0f} diagrams/s".format(count, elapsed, count / elapsed))
+    if 'matplotlib' in sys.modules:
+        sys.exit("matplotlib was imported")
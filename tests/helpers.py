@@ -0,0 +1,79 @@
+"""Helpers shared by the tests and the benchmark scripts"""
+import os
+import subprocess
+import sys
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.shape import Shape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Module whose import time is checked, and its budget
+MODULE = "PyFreatboard.build_shape"
+BUDGET_MS = 50.0
+
+
+def reference_filter_shapes(shapes):
+    """Quadratic filter_shapes of PyFreatboard 0.3, kept as reference"""
+    shapes.sort()
+    for i, s in enumerate(shapes):
+        extensions = s.get_extensions()
+        if extensions >= 4:
+            s.valid = False
+        if s.valid:
+            # Remove same position with less notes in 6th string
+            last_finger = s.fingers[-1]
+            for j, s2 in enumerate(shapes[i+1:]):
+                if s2.valid and s2.fingers[-1] == last_finger and len(s2.fingers) != len(s.fingers):
+                    same_shape = True
+                    k = 1
+                    while same_shape and k < min(len(s.fingers), len(s2.fingers)):
+                        index = -1 - k
+                        if s.fingers[index] == s2.fingers[index]:
+                            k += 1
+                        else:
+                            same_shape = False
+                    if same_shape:
+                        if len(s2.fingers) < len(s.fingers):
+                            s2.valid = False
+                        else:
+                            s.valid = False
+
+            # Remove same position with more extensions
+            first_finger = s.fingers[0]
+            for j, s2 in enumerate(shapes[i+1:]):
+                if s2.valid and s2.fingers[0] == first_finger:
+                    if s2.get_extensions() >= extensions:
+                        s2.valid = False
+                    else:
+                        s.valid = False
+    return shapes
+
+
+def fingered_shapes(root, shape_type):
+    return [s.set_fingering() for s in BuildShape(root, shape_type).scale_to_freatboard()]
+
+
+def copy_shapes(shapes):
+    copies = []
+    for s in shapes:
+        c = Shape(list(s.fingers))
+        c.valid = s.valid
+        copies.append(c)
+    return copies
+
+
+def import_time(module):
+    """Cumulative import time of module in microseconds and the list of imported modules"""
+    # run from the repository root, so the checkout is imported
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            capture_output=True, text=True, check=True, cwd=ROOT)
+    cumulative = None
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        name = fields[2].strip()
+        modules.append(name)
+        if name == module:
+            cumulative = int(fields[1])
+    return cumulative, modules
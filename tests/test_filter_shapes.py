@@ -0,0 +1,14 @@
+import pytest
+from PyFreatboard.build_shape import BuildShape
+from PyFreatboard.finger import Finger
+from tests.helpers import copy_shapes, fingered_shapes, reference_filter_shapes
+
+
+@pytest.mark.parametrize("shape_type", list(BuildShape.SHAPES))
+def test_filter_shapes_matches_reference(shape_type):
+    """filter_shapes keeps the same shapes, in the same order, than the quadratic filter of 0.3"""
+    for root in Finger.NOTES:
+        shapes = fingered_shapes(root, shape_type)
+        reference = reference_filter_shapes(copy_shapes(shapes))
+        new = BuildShape.filter_shapes(copy_shapes(shapes))
+        assert [(s.valid, s.get_key()) for s in new] == [(s.valid, s.get_key()) for s in reference], root
@@ -0,0 +1,15 @@
+import os
+import pytest
+from tests.helpers import BUDGET_MS, MODULE, import_time
+
+
+def test_build_shape_does_not_import_matplotlib():
+    _, modules = import_time(MODULE)
+    assert not [m for m in modules if m.split(".")[0] == "matplotlib"]
+
+
+# Wall clock timings depend on the machine and its load, run with PYFREATBOARD_TIMING=1
+@pytest.mark.skipif(not os.environ.get("PYFREATBOARD_TIMING"), reason="set PYFREATBOARD_TIMING=1 to check timings")
+def test_build_shape_import_budget():
+    cumulative, _ = import_time(MODULE)
+    assert cumulative / 1000 <= BUDGET_MS
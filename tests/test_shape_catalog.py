@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+from PyFreatboard.shape_cache import ShapeCache
+from PyFreatboard.shape_catalog import ShapeCatalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHAPE_TYPES = ['-7', 'Maj7']
+ROOTS = ['C', 'F#']
+
+
+def test_catalog_drops_keep_index(tmp_path):
+    """Drops read from a catalog are numbered like the generated ones"""
+    file_name = str(tmp_path / 'catalog.bin')
+    ShapeCatalog.build(file_name, SHAPE_TYPES, ROOTS)
+    cache = ShapeCache(catalog=ShapeCatalog(file_name))
+    generated = ShapeCache()
+    for shape_type in SHAPE_TYPES:
+        for root in ROOTS:
+            for drop in ShapeCatalog.DROPS:
+                for bass_string in ShapeCatalog.BASS_STRINGS:
+                    expected = generated.get_drops(root, shape_type, drop, bass_string)
+                    shapes = cache.get_drops(root, shape_type, drop, bass_string)
+                    assert [(s.pack(), s.index) for s in shapes] == [(s.pack(), s.index) for s in expected]
+    assert not cache.positions
+    cache.catalog.close()
+
+
+def test_catalog_environment_variable(tmp_path):
+    """Processes started with PYFREATBOARD_CATALOG set read the catalog"""
+    file_name = str(tmp_path / 'catalog.bin')
+    ShapeCatalog.build(file_name, SHAPE_TYPES, ROOTS)
+    code = "from PyFreatboard.shape_cache import SHAPE_CACHE; print(SHAPE_CACHE.catalog.file_name)"
+    env = dict(os.environ, **{ShapeCache.CATALOG_VARIABLE: file_name})
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    assert result.stdout.strip() == file_name